@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.checks import Tags
+from django.core.checks import Warning
+from django.core.checks import register
+from django.db import DatabaseError
+
+from core.tasks import stalled_tasks
+
+
+@register(Tags.database)
+def check_task_worker(app_configs, **kwargs):
+    """Предупреждает, если задачи очереди давно никто не выполняет.
+
+    Проверка обращается к базе, поэтому Django запускает её при
+    migrate и по check --tag database.
+    """
+    if settings.TASKS_EAGER:
+        return []
+    try:
+        stalled = stalled_tasks()
+    except DatabaseError:
+        # Таблицы очереди ещё нет: миграции не применены
+        return []
+    if not stalled:
+        return []
+    return [Warning(
+        f"Задач, ждущих воркера дольше {settings.TASKS_LOCK_TIMEOUT} с: "
+        f"{stalled}",
+        hint=(
+            "Запустите python manage.py run_tasks или задайте "
+            "TASKS_EAGER=1, чтобы выполнять задачи без воркера."
+        ),
+        id="core.W001",
+    )]
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+# Сколько последних событий хранится для переподключившихся клиентов
+EVENT_BUFFER = 1000
+Event = namedtuple("Event", "id channel data")
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """Брокер событий процесса из settings.EVENTS_BROKER."""
+    return import_string(settings.EVENTS_BROKER)()
+
+
+class LocalBroker:
+    """Pub/sub в памяти процесса.
+
+    Последние события лежат в кольцевом буфере, слушатели спят
+    на Condition и просыпаются при публикации, не опрашивая
+    ничего. События видны только в своём процессе.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=EVENT_BUFFER)
+        self.last_id = 0
+
+    def publish(self, channel, data):
+        with self.condition:
+            self.last_id += 1
+            self.events.append(Event(self.last_id, channel, data))
+            self.condition.notify_all()
+        return self.last_id
+
+    def listen(self, channels, after, timeout):
+        """Ждёт событий после after не дольше timeout секунд.
+
+        Возвращает новую позицию и события нужных каналов; позиция
+        сдвигается и из-за событий других каналов. after=None или
+        позиция из будущего (процесс перезапущен) означают «с этого
+        момента».
+        """
+        with self.condition:
+            if after is None or after > self.last_id:
+                after = self.last_id
+            self.condition.wait_for(lambda: self.last_id > after, timeout)
+            return self.last_id, [
+                event for event in self.events
+                if event.id > after and event.channel in channels
+            ]
+
+
+class CacheBroker:
+    """Pub/sub через общий кеш, видный всем процессам.
+
+    Номер последнего события — счётчик в кеше, события лежат под
+    ключами с номером. Слушатели опрашивают счётчик раз
+    в settings.EVENTS_POLL_INTERVAL секунд. Доставка без гарантий:
+    событие, вытесненное из кеша, пропускается.
+    """
+    SEQUENCE_KEY = "events:last_id"
+    EVENT_KEY = "events:{}"
+
+    def publish(self, channel, data):
+        cache.add(self.SEQUENCE_KEY, 0, None)
+        event_id = cache.incr(self.SEQUENCE_KEY)
+        cache.set(
+            self.EVENT_KEY.format(event_id),
+            (channel, data),
+            settings.EVENTS_TTL
+        )
+        return event_id
+
+    def listen(self, channels, after, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            last_id = cache.get(self.SEQUENCE_KEY, 0)
+            if after is None or after > last_id:
+                after = last_id
+            if last_id > after:
+                first_id = max(after, last_id - EVENT_BUFFER) + 1
+                ids = range(first_id, last_id + 1)
+                found = cache.get_many(
+                    [self.EVENT_KEY.format(event_id) for event_id in ids]
+                )
+                events = []
+                for event_id in ids:
+                    event = found.get(self.EVENT_KEY.format(event_id))
+                    if event is not None and event[0] in channels:
+                        events.append(Event(event_id, *event))
+                return last_id, events
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return after, []
+            time.sleep(min(settings.EVENTS_POLL_INTERVAL, remaining))
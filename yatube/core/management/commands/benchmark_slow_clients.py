@@ -0,0 +1,126 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from posts.management.commands.benchmark_views import percentile
+
+# Через сколько секунд после медленных клиентов идут замеры
+PROBE_START = 0.5
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает запущенный сервер медленными клиентами и замеряет, "
+        "как быстро в это время отвечают обычные запросы. Сравните "
+        "gunicorn (yatube.wsgi) и uvicorn (yatube.asgi)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "url",
+            help="Адрес страницы, например http://127.0.0.1:8000/"
+        )
+        parser.add_argument(
+            "--clients",
+            type=int,
+            default=200,
+            help="Число медленных клиентов"
+        )
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=5,
+            help="Сколько секунд медленный клиент отправляет запрос"
+        )
+        parser.add_argument(
+            "--probes",
+            type=int,
+            default=20,
+            help="Число обычных запросов во время нагрузки"
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30,
+            help="Предел ожидания одного ответа, секунды"
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("Нужен адрес вида http://host:port/path")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.path = url.path or "/"
+        if url.query:
+            self.path += f"?{url.query}"
+        self.timeout = options["timeout"]
+
+        slow, probes = asyncio.run(self.run(
+            options["clients"], options["delay"], options["probes"]
+        ))
+        completed = [duration for duration in probes if duration is not None]
+        if not completed:
+            raise CommandError("Сервер не ответил ни на один запрос")
+        self.stdout.write(
+            f"медленных клиентов: {options['clients']}, "
+            f"ответов им: {sum(slow)}"
+        )
+        self.stdout.write(
+            f"обычные запросы: {len(completed)}/{len(probes)}  "
+            f"p50 {percentile(completed, 50):8.2f} мс  "
+            f"p95 {percentile(completed, 95):8.2f} мс  "
+            f"среднее {statistics.mean(completed):8.2f} мс"
+        )
+
+    def request_head(self):
+        return (
+            f"GET {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Connection: close\r\n"
+        ).encode()
+
+    async def fetch(self, delay=0):
+        """Отправляет запрос, растянув его на delay секунд.
+
+        Возвращает время ответа в миллисекундах или None.
+        """
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout
+            )
+        except (OSError, asyncio.TimeoutError):
+            return None
+        try:
+            # Медленный клиент держит соединение, недослав заголовки
+            writer.write(self.request_head())
+            await writer.drain()
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(b"\r\n")
+            await writer.drain()
+            status = await asyncio.wait_for(reader.readline(), self.timeout)
+            await asyncio.wait_for(reader.read(), self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        finally:
+            writer.close()
+        if not status.startswith(b"HTTP/1.1 200"):
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    async def run(self, clients, delay, probes):
+        slow = [
+            asyncio.ensure_future(self.fetch(delay)) for _ in range(clients)
+        ]
+        await asyncio.sleep(PROBE_START)
+        durations = []
+        for _ in range(probes):
+            durations.append(await self.fetch())
+        done = await asyncio.gather(*slow)
+        return [duration is not None for duration in done], durations
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.tasks import claim_task
+from core.tasks import release_stale
+from core.tasks import run_task
+
+
+class Command(BaseCommand):
+    help = (
+        "Воркер очереди задач: выполняет задачи по приоритету "
+        "и повторяет неудачные с нарастающей паузой"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить готовые задачи и завершиться"
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Пауза между опросами пустой очереди, секунды"
+        )
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        self.release()
+        try:
+            while True:
+                queued = claim_task()
+                if queued is None:
+                    if options["once"]:
+                        break
+                    close_old_connections()
+                    time.sleep(options["sleep"])
+                    self.release()
+                    continue
+                if run_task(queued):
+                    done += 1
+                else:
+                    failed += 1
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Выполнено задач: {done}, с ошибкой: {failed}"
+        ))
+
+    def release(self):
+        released = release_stale()
+        if released:
+            self.stderr.write(f"Возвращено брошенных задач: {released}")
@@ -0,0 +1,72 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Отложенная задача очереди в базе; её выполняет run_tasks."""
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "Ожидает"),
+        (RUNNING, "Выполняется"),
+        (FAILED, "Ошибка"),
+    )
+
+    name = models.CharField(
+        verbose_name="Функция",
+        max_length=200
+    )
+    args = models.TextField(
+        verbose_name="Аргументы в JSON",
+        default="[]"
+    )
+    priority = models.SmallIntegerField(
+        verbose_name="Приоритет",
+        default=0
+    )
+    status = models.CharField(
+        verbose_name="Состояние",
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name="Попыток",
+        default=0
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name="Предел попыток",
+        default=5
+    )
+    run_at = models.DateTimeField(
+        verbose_name="Запустить не раньше",
+        default=timezone.now
+    )
+    locked_at = models.DateTimeField(
+        verbose_name="Взята в работу",
+        null=True,
+        blank=True
+    )
+    last_error = models.TextField(
+        verbose_name="Последняя ошибка",
+        blank=True
+    )
+    created = models.DateTimeField(
+        verbose_name="Создана",
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = "Задача"
+        verbose_name_plural = "Задачи"
+        indexes = [
+            # Выбор следующей задачи: status, затем порядок очереди
+            models.Index(
+                fields=["status", "-priority", "run_at"],
+                name="core_task_queue_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
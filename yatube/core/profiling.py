@@ -0,0 +1,266 @@
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template
+from django.template.backends.django import reraise
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы длительности запроса, секунды
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf")
+)
+_MISSING = object()
+_local = threading.local()
+
+
+class RequestProfile:
+    """Счётчики одного запроса, который попал в выборку."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Базовый get_many вызывает get для каждого ключа: такие
+        # вложенные обращения не считаются повторно
+        self.cache_depth = 0
+
+    def record_cache(self, hits, misses):
+        if self.cache_depth == 0:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+
+
+def current_profile():
+    return getattr(_local, "profile", None)
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.duration = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class MetricsRegistry:
+    """Агрегаты по view за время жизни процесса.
+
+    Каждый процесс gunicorn копит свои значения, Prometheus
+    суммирует их по экземплярам.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view, duration, profile):
+        with self.lock:
+            metrics = self.views.setdefault(view, ViewMetrics())
+            metrics.requests += 1
+            metrics.duration += duration
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[index] += 1
+            metrics.queries += profile.queries
+            metrics.sql_time += profile.sql_time
+            metrics.render_time += profile.render_time
+            metrics.cache_hits += profile.cache_hits
+            metrics.cache_misses += profile.cache_misses
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        """Текст в формате экспозиции Prometheus."""
+        with self.lock:
+            views = sorted(self.views.items())
+        lines = [
+            "# HELP yatube_request_duration_seconds "
+            "Длительность запросов из выборки.",
+            "# TYPE yatube_request_duration_seconds histogram",
+        ]
+        for view, metrics in views:
+            label = _label(view)
+            for bound, count in zip(DURATION_BUCKETS, metrics.buckets):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f'yatube_request_duration_seconds_bucket'
+                    f'{{view="{label}",le="{le}"}} {count}'
+                )
+            lines.append(
+                f'yatube_request_duration_seconds_sum{{view="{label}"}} '
+                f'{metrics.duration}'
+            )
+            lines.append(
+                f'yatube_request_duration_seconds_count{{view="{label}"}} '
+                f'{metrics.requests}'
+            )
+        counters = (
+            ("db_queries_total", "queries", "SQL-запросы."),
+            ("db_query_seconds_total", "sql_time", "Время SQL-запросов."),
+            ("template_render_seconds_total", "render_time",
+             "Время рендеринга шаблонов."),
+            ("cache_hits_total", "cache_hits", "Попадания в кеш."),
+            ("cache_misses_total", "cache_misses", "Промахи кеша."),
+        )
+        for name, attr, help_text in counters:
+            lines.append(f"# HELP yatube_{name} {help_text}")
+            lines.append(f"# TYPE yatube_{name} counter")
+            for view, metrics in views:
+                lines.append(
+                    f'yatube_{name}{{view="{_label(view)}"}} '
+                    f'{getattr(metrics, attr)}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n"
+    )
+
+
+registry = MetricsRegistry()
+
+
+def instrument_cache(cache):
+    """Подменяет get и get_many экземпляра кеша счётчиками.
+
+    Экземпляры кеша живут в своём потоке, поэтому подмена делается
+    один раз; вне профилируемого запроса обёртки ничего не считают.
+    """
+    if getattr(cache, "_profiled", False):
+        return
+    get, get_many = cache.get, cache.get_many
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        profile = current_profile()
+        if profile is not None:
+            profile.record_cache(
+                hits=int(value is not _MISSING),
+                misses=int(value is _MISSING)
+            )
+        return default if value is _MISSING else value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        profile = current_profile()
+        if profile is None:
+            return get_many(keys, version=version)
+        profile.cache_depth += 1
+        try:
+            values = get_many(keys, version=version)
+        finally:
+            profile.cache_depth -= 1
+        profile.record_cache(
+            hits=len(values), misses=len(keys) - len(values)
+        )
+        return values
+
+    cache.get = counted_get
+    cache.get_many = counted_get_many
+    cache._profiled = True
+
+
+class ProfilingMiddleware:
+    """Профилирует часть запросов и копит метрики по view.
+
+    Для запроса из выборки (settings.PROFILING_SAMPLE_RATE)
+    считаются SQL-запросы и их время, время рендеринга шаблонов
+    и обращения к кешу. Итог пишется в лог одной JSON-строкой
+    и попадает в метрики /metrics/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        for alias in settings.CACHES:
+            instrument_cache(caches[alias])
+        start = time.perf_counter()
+        _local.profile = profile
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(
+                            profile.sql_wrapper
+                        )
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unresolved"
+        registry.observe(view, duration, profile)
+        logger.info(json.dumps(dict(
+            view=view,
+            method=request.method,
+            status=response.status_code,
+            duration=round(duration, 6),
+            queries=profile.queries,
+            sql_time=round(profile.sql_time, 6),
+            render_time=round(profile.render_time, 6),
+            cache_hits=profile.cache_hits,
+            cache_misses=profile.cache_misses,
+        )))
+        return response
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = current_profile()
+        if profile is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.render_time += time.perf_counter() - start
+
+
+class ProfilingTemplates(DjangoTemplates):
+    """Шаблонизатор Django, который замеряет время рендеринга."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(
+                self.engine.get_template(template_name), self
+            )
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,119 @@
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_cache_control
+from django.utils.cache import patch_vary_headers
+
+PRIMARY = "default"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+_local = threading.local()
+
+
+def replica_aliases():
+    """Псевдонимы всех баз, кроме основной, — это реплики."""
+    return [alias for alias in settings.DATABASES if alias != PRIMARY]
+
+
+def is_pinned():
+    return getattr(_local, "pinned", 0) > 0
+
+
+@contextmanager
+def use_primary():
+    """Направляет чтение текущего потока в основную базу."""
+    _local.pinned = getattr(_local, "pinned", 0) + 1
+    try:
+        yield
+    finally:
+        _local.pinned -= 1
+
+
+class ReplicaRouter:
+    """Чтение из реплик, запись и миграции — в основную базу.
+
+    Чтение остаётся в основной базе, пока поток закреплён за ней
+    (use_primary) или внутри её транзакции: в транзакции нужны
+    только что записанные строки.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if (
+            not replicas
+            or is_pinned()
+            or connections[PRIMARY].in_atomic_block
+        ):
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class PrimaryStickinessMiddleware:
+    """Закрепляет за основной базой пишущие запросы и их автора.
+
+    Запрос с небезопасным методом целиком читает из основной базы
+    и ставит cookie на settings.REPLICA_STICKY_SECONDS. Пока cookie
+    жива, запросы этого клиента тоже читают из основной базы:
+    автор сразу видит свой пост, даже если реплика отстаёт. Такие
+    ответы не попадают в общие кеши: иначе прокси отдал бы автору
+    страницу, собранную до записи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = request.method not in SAFE_METHODS
+        if not writes and (
+            settings.REPLICA_STICKY_COOKIE not in request.COOKIES
+        ):
+            return self.get_response(request)
+
+        with use_primary():
+            response = self.get_response(request)
+        if writes:
+            stick_to_primary(response)
+        patch_cache_control(response, private=True, no_store=True)
+        patch_vary_headers(response, ("Cookie",))
+        return response
+
+
+def stick_to_primary(response):
+    """Ставит cookie, закрепляющую клиента за основной базой."""
+    response.set_cookie(
+        settings.REPLICA_STICKY_COOKIE,
+        "1",
+        max_age=settings.REPLICA_STICKY_SECONDS,
+        httponly=True,
+        samesite="Lax",
+    )
+    patch_cache_control(response, private=True, no_store=True)
+    patch_vary_headers(response, ("Cookie",))
+
+
+def writes_on_get(view):
+    """Для view, которые пишут в базу и на GET-запрос.
+
+    Middleware узнаёт пишущий запрос по методу, поэтому такой view
+    сам работает с основной базой и закрепляет за ней клиента.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with use_primary():
+            response = view(request, *args, **kwargs)
+        stick_to_primary(response)
+        return response
+    return wrapper
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Применяет settings.SQLITE_PRAGMAS к новому соединению SQLite.
+
+    journal_mode=wal хранится в файле базы, остальные настройки
+    действуют только на соединение и задаются каждый раз.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
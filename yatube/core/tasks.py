@@ -0,0 +1,181 @@
+import json
+import logging
+import random
+import traceback
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Task
+from core.routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_LOW = -10
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+STALL_CHECK_KEY = "tasks:stall_checked"
+
+
+def task(priority=PRIORITY_NORMAL, max_attempts=5):
+    """Делает функцию задачей очереди: появляется метод delay.
+
+    Задача находится по пути модуля и имени функции, поэтому
+    функция должна лежать на верхнем уровне модуля, а аргументы —
+    сериализоваться в JSON.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__name__}"
+        func.delay = partial(enqueue, name, priority, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, priority, max_attempts, *args):
+    """Ставит задачу в очередь после коммита текущей транзакции.
+
+    При settings.TASKS_EAGER задача выполняется без воркера, тоже
+    после коммита: так удобнее в тестах и при разработке.
+    """
+    if settings.TASKS_EAGER:
+        transaction.on_commit(partial(run_eager, name, args))
+        return
+    transaction.on_commit(partial(
+        create_task, name, args, priority, max_attempts
+    ))
+
+
+def run_eager(name, args):
+    try:
+        import_string(name)(*args)
+    except Exception:
+        logger.exception("Задача %s завершилась ошибкой", name)
+
+
+def create_task(name, args, priority, max_attempts):
+    Task.objects.create(
+        name=name,
+        args=json.dumps(args),
+        priority=priority,
+        max_attempts=max_attempts,
+    )
+    warn_if_stalled()
+
+
+def stalled_tasks():
+    """Сколько задач ждут воркера дольше settings.TASKS_LOCK_TIMEOUT.
+
+    Работающий воркер забирает готовые задачи за секунды, так что
+    такие задачи значат, что run_tasks не запущен или не успевает.
+    """
+    overdue = timezone.now() - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    with use_primary():
+        return Task.objects.filter(
+            status=Task.PENDING, run_at__lt=overdue
+        ).count()
+
+
+def warn_if_stalled():
+    """Пишет в лог, если очередь никто не разбирает.
+
+    Проверка идёт не чаще раза в settings.TASKS_LOCK_TIMEOUT секунд
+    на процесс, остальные вызовы стоят одного обращения к кешу.
+    """
+    if not cache.add(STALL_CHECK_KEY, True, settings.TASKS_LOCK_TIMEOUT):
+        return
+    stalled = stalled_tasks()
+    if stalled:
+        logger.warning(
+            "Задач, ждущих воркера дольше %s с: %s. Запущен ли run_tasks?",
+            settings.TASKS_LOCK_TIMEOUT,
+            stalled
+        )
+
+
+def release_stale():
+    """Возвращает в очередь задачи, чей воркер пропал.
+
+    Задача считается брошенной, если выполняется дольше
+    settings.TASKS_LOCK_TIMEOUT секунд. Брошенная задача, исчерпавшая
+    попытки, получает ошибку: иначе задача, которая роняет воркер,
+    повторялась бы вечно.
+    """
+    expired = timezone.now() - timedelta(seconds=settings.TASKS_LOCK_TIMEOUT)
+    with use_primary():
+        stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=expired)
+        failed = stale.filter(attempts__gte=F("max_attempts")).update(
+            status=Task.FAILED,
+            locked_at=None,
+            last_error="Воркер пропал во время выполнения задачи"
+        )
+        if failed:
+            logger.error(
+                "Брошенных задач с исчерпанными попытками: %s", failed
+            )
+        return stale.update(status=Task.PENDING, locked_at=None)
+
+
+def claim_task():
+    """Забирает следующую задачу очереди или возвращает None.
+
+    Задача захватывается условным UPDATE: если её забрал другой
+    воркер, строка не обновится и берётся следующая. Так очередь
+    работает и в SQLite, где нет SELECT ... FOR UPDATE SKIP LOCKED.
+    Очередь читается из основной базы: на отстающей реплике уже
+    захваченная задача выглядела бы свободной.
+    """
+    with use_primary():
+        while True:
+            now = timezone.now()
+            task_id = Task.objects.filter(
+                status=Task.PENDING, run_at__lte=now
+            ).order_by("-priority", "run_at", "id").values_list(
+                "id", flat=True
+            ).first()
+            if task_id is None:
+                return None
+            claimed = Task.objects.filter(
+                pk=task_id, status=Task.PENDING
+            ).update(
+                status=Task.RUNNING,
+                locked_at=now,
+                attempts=F("attempts") + 1
+            )
+            if claimed:
+                return Task.objects.get(pk=task_id)
+
+
+def backoff(attempts):
+    """Пауза перед повтором: экспонента с разбросом до 10 %."""
+    delay = settings.TASKS_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=delay * random.uniform(1, 1.1))
+
+
+def run_task(queued):
+    """Выполняет задачу; удачная удаляется, неудачная ждёт повтора."""
+    try:
+        # Задача читает только что записанное: реплика может отставать
+        with use_primary():
+            import_string(queued.name)(*json.loads(queued.args))
+    except Exception:
+        queued.last_error = traceback.format_exc()
+        queued.locked_at = None
+        if queued.attempts >= queued.max_attempts:
+            queued.status = Task.FAILED
+            logger.exception("Задача %s не выполнена", queued)
+        else:
+            queued.status = Task.PENDING
+            queued.run_at = timezone.now() + backoff(queued.attempts)
+            logger.warning("Задача %s будет повторена", queued)
+        queued.save(update_fields=[
+            "attempts", "last_error", "locked_at", "status", "run_at"
+        ])
+        return False
+    queued.delete()
+    return True
@@ -0,0 +1,445 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db import connections
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import Client
+from django.test import LiveServerTestCase
+from django.test import RequestFactory
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.checks import check_task_worker
+from core.events import CacheBroker
+from core.events import LocalBroker
+from core.models import Task
+from core.profiling import registry
+from core.routers import PrimaryStickinessMiddleware
+from core.routers import ReplicaRouter
+from core.routers import replica_aliases
+from core.routers import use_primary
+from core.signals import configure_sqlite
+from core.tasks import PRIORITY_HIGH
+from core.tasks import PRIORITY_LOW
+from core.tasks import STALL_CHECK_KEY
+from core.tasks import release_stale
+from core.tasks import task
+from core.tasks import warn_if_stalled
+from posts.models import Post
+from posts.models import User
+
+CALLS = []
+
+
+@task()
+def record(value):
+    CALLS.append(value)
+
+
+@task(max_attempts=2)
+def fail():
+    raise ValueError("Ошибка задачи")
+
+
+@override_settings(
+    PROFILING_SAMPLE_RATE=1.0,
+    INTERNAL_IPS=["127.0.0.1"],
+    METRICS_TOKEN="secret",
+    METRICS_ALLOW_INTERNAL_IPS=False,
+)
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        Post.objects.create(author=cls.user, text="Текст поста")
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.client = Client(REMOTE_ADDR="127.0.0.1")
+
+    def test_request_is_profiled(self):
+        """Запрос из выборки пишет в лог запросы, рендер и кеш."""
+        with self.assertLogs("core.profiling", "INFO") as logs:
+            self.client.get(reverse("posts:index"))
+            self.client.get(reverse("posts:index"))
+
+        first, second = (
+            json.loads(record.getMessage()) for record in logs.records
+        )
+        self.assertEqual(first["view"], "posts:index")
+        self.assertEqual(first["status"], 200)
+        self.assertGreater(first["queries"], 0)
+        self.assertGreater(first["render_time"], 0)
+        self.assertGreater(first["cache_misses"], 0)
+        # Вторая страница отдаётся из кеша без запросов к базе
+        self.assertEqual(second["queries"], 0)
+        self.assertGreater(second["cache_hits"], 0)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0.0)
+    def test_request_is_not_sampled(self):
+        """Запросы вне выборки не профилируются."""
+        self.client.get(reverse("posts:index"))
+        self.assertEqual(registry.views, {})
+
+    def test_metrics_endpoint(self):
+        """/metrics/ отдаёт агрегаты в формате Prometheus."""
+        self.client.get(reverse("posts:index"))
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 1',
+            content
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', content)
+
+    def test_metrics_endpoint_is_private(self):
+        """Посторонним /metrics/ не виден."""
+        response = Client(REMOTE_ADDR="10.0.0.1").get(reverse("metrics"))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_internal_ips_are_opt_in(self):
+        """Адрес из INTERNAL_IPS даёт доступ, только если это включено."""
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+        with self.settings(METRICS_ALLOW_INTERNAL_IPS=True):
+            response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+
+
+@mock.patch("core.routers.replica_aliases", return_value=["replica_1"])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_db(self, request):
+        """Прогоняет запрос через middleware и узнаёт базу чтения."""
+        seen = {}
+
+        def view(request):
+            seen["db"] = self.router.db_for_read(Post)
+            return HttpResponse()
+
+        response = PrimaryStickinessMiddleware(view)(request)
+        return seen["db"], response
+
+    def test_reads_go_to_replica_and_writes_to_primary(self, _):
+        """Чтение уходит в реплику, запись — в основную базу."""
+        self.assertEqual(self.router.db_for_read(Post), "replica_1")
+        self.assertEqual(self.router.db_for_write(Post), "default")
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Post), "default")
+
+    def test_migrations_only_on_primary(self, _):
+        """Миграции применяются только к основной базе."""
+        self.assertTrue(self.router.allow_migrate("default", "posts"))
+        self.assertFalse(self.router.allow_migrate("replica_1", "posts"))
+
+    def test_write_request_sticks_to_primary(self, _):
+        """После записи клиент на время читает из основной базы."""
+        db, response = self.read_db(self.factory.post("/"))
+        self.assertEqual(db, "default")
+        cookie = response.cookies[settings.REPLICA_STICKY_COOKIE]
+        self.assertEqual(
+            cookie["max-age"], settings.REPLICA_STICKY_SECONDS
+        )
+
+        request = self.factory.get("/")
+        request.COOKIES[settings.REPLICA_STICKY_COOKIE] = "1"
+        db, response = self.read_db(request)
+        self.assertEqual(db, "default")
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+        db, response = self.read_db(self.factory.get("/"))
+        self.assertEqual(db, "replica_1")
+        self.assertFalse(response.has_header("Cache-Control"))
+
+    def test_sticky_responses_are_not_shared(self, _):
+        """Ответы из основной базы не попадают в общие кеши."""
+        request = self.factory.get("/")
+        request.COOKIES[settings.REPLICA_STICKY_COOKIE] = "1"
+        for request in (self.factory.post("/"), request):
+            with self.subTest(method=request.method):
+                _, response = self.read_db(request)
+                self.assertIn("private", response["Cache-Control"])
+                self.assertIn("no-store", response["Cache-Control"])
+                self.assertIn("Cookie", response["Vary"])
+
+
+class ReplicaFileTest(TransactionTestCase):
+    """Реплика — отдельный файл SQLite, отстающий от основной базы."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="replica")
+        self.client.force_login(self.author)
+        Post.objects.create(author=self.author, text="Старый пост")
+        self.other = User.objects.create_user(username="other")
+        Post.objects.create(author=self.other, text="Пост другого автора")
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "replica.sqlite3")
+        # Снимок основной базы: после него реплика отстаёт
+        with closing(sqlite3.connect(path)) as replica:
+            connection.connection.backup(replica)
+        connections.databases["replica_1"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": path,
+        }
+        self.addCleanup(self.remove_replica)
+
+    def remove_replica(self):
+        connections["replica_1"].close()
+        delattr(connections._connections, "replica_1")
+        del connections.databases["replica_1"]
+
+    def test_sticky_client_reads_primary(self):
+        """Автор видит свой пост, хотя реплика ещё отстаёт."""
+        self.assertEqual(replica_aliases(), ["replica_1"])
+        self.client.post(reverse("posts:post_create"), {"text": "Новый пост"})
+        self.assertFalse(
+            Post.objects.using("replica_1").filter(text="Новый пост").exists()
+        )
+        profile = reverse("posts:profile", args=[self.author.username])
+
+        response = self.client.get(profile)
+        self.assertContains(response, "Новый пост")
+        self.assertContains(response, "Старый пост")
+
+    def test_cached_page_is_built_from_primary(self):
+        """Страница новой версии кешируется по основной базе."""
+        self.client.post(reverse("posts:post_create"), {"text": "Новый пост"})
+        profile = reverse("posts:profile", args=[self.author.username])
+
+        # Первый после записи аноним собирает страницу для кеша
+        self.assertContains(Client().get(profile), "Новый пост")
+        self.assertContains(Client().get(profile), "Новый пост")
+
+    def test_follow_on_get_sticks_to_primary(self):
+        """Подписка GET-запросом тоже закрепляет клиента за основной."""
+        response = self.client.get(
+            reverse("posts:profile_follow", args=[self.other.username])
+        )
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+        self.assertIn("no-store", response["Cache-Control"])
+
+        response = self.client.get(reverse("posts:follow_index"))
+        self.assertContains(response, "Пост другого автора")
+
+
+class SqlitePragmasTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def apply(self, pragmas):
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            configure_sqlite(None, connection)
+
+    def test_pragmas_from_settings(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        # Соединение общее для всех тестов: вернуть прежние значения
+        self.addCleanup(self.apply, {
+            "cache_size": self.pragma("cache_size"),
+            "busy_timeout": self.pragma("busy_timeout"),
+        })
+        self.apply({"cache_size": -1234, "busy_timeout": 4321})
+
+        self.assertEqual(self.pragma("cache_size"), -1234)
+        self.assertEqual(self.pragma("busy_timeout"), 4321)
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def queue(self, name, *args, **fields):
+        return Task.objects.create(
+            name=f"core.tests.{name}", args=json.dumps(args), **fields
+        )
+
+    def run_tasks(self):
+        call_command("run_tasks", "--once", stdout=StringIO())
+
+    def test_tasks_run_by_priority(self):
+        """Воркер выполняет задачи по приоритету и удаляет их."""
+        self.queue("record", "low", priority=PRIORITY_LOW)
+        self.queue("record", "high", priority=PRIORITY_HIGH)
+        self.queue("record", "later", run_at=timezone.now() + timedelta(1))
+        self.run_tasks()
+
+        self.assertEqual(CALLS, ["high", "low"])
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_failed_task_is_retried_with_backoff(self):
+        """Неудачная задача откладывается, а после предела — ошибка."""
+        queued = self.queue("fail", max_attempts=2)
+        with self.assertLogs("core.tasks", "WARNING"):
+            self.run_tasks()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn("Ошибка задачи", queued.last_error)
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs("core.tasks", "ERROR"):
+            self.run_tasks()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertEqual(queued.attempts, 2)
+
+    def test_stale_task_is_released(self):
+        """Задача пропавшего воркера возвращается в очередь."""
+        queued = self.queue(
+            "record",
+            "stale",
+            status=Task.RUNNING,
+            locked_at=timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(release_stale(), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.PENDING)
+
+    def test_stale_task_without_attempts_fails(self):
+        """Брошенная задача с исчерпанными попытками получает ошибку."""
+        queued = self.queue(
+            "record",
+            "crash",
+            status=Task.RUNNING,
+            attempts=2,
+            max_attempts=2,
+            locked_at=timezone.now() - timedelta(days=1)
+        )
+        with self.assertLogs("core.tasks", "ERROR"):
+            self.assertEqual(release_stale(), 0)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertIsNone(queued.locked_at)
+        self.assertIn("Воркер пропал", queued.last_error)
+
+    def test_stalled_queue_is_reported(self):
+        """Очередь, которую не разбирает воркер, видна в check и логе."""
+        self.assertEqual(check_task_worker(None), [])
+        self.queue(
+            "record",
+            "stalled",
+            run_at=timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(
+            [warning.id for warning in check_task_worker(None)],
+            ["core.W001"]
+        )
+
+        cache.delete(STALL_CHECK_KEY)
+        with self.assertLogs("core.tasks", "WARNING"):
+            warn_if_stalled()
+        # Следующая проверка — не раньше чем через TASKS_LOCK_TIMEOUT
+        with self.assertNumQueries(0):
+            warn_if_stalled()
+
+
+class TaskEnqueueTest(TransactionTestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_task_is_queued_after_commit(self):
+        """Задача попадает в очередь только после коммита."""
+        with transaction.atomic():
+            record.delay("committed")
+            self.assertFalse(Task.objects.exists())
+        queued = Task.objects.get()
+        self.assertEqual(queued.name, "core.tests.record")
+        self.assertEqual(json.loads(queued.args), ["committed"])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_task_runs_after_commit(self):
+        """С TASKS_EAGER задача выполняется без очереди после коммита."""
+        with transaction.atomic():
+            record.delay("eager")
+            self.assertEqual(CALLS, [])
+        self.assertEqual(CALLS, ["eager"])
+        self.assertFalse(Task.objects.exists())
+
+    @mock.patch("core.routers.replica_aliases", return_value=["replica_1"])
+    def test_worker_reads_queue_from_primary(self, _):
+        """Воркер читает очередь из основной базы, а не из реплики."""
+        record.delay("primary")
+        call_command("run_tasks", "--once", stdout=StringIO())
+        self.assertEqual(CALLS, ["primary"])
+        self.assertFalse(Task.objects.using("default").exists())
+
+
+class SlowClientsBenchmarkTest(LiveServerTestCase):
+    def test_benchmark_against_live_server(self):
+        """Замер отвечает временем обычных запросов под нагрузкой."""
+        out = StringIO()
+        call_command(
+            "benchmark_slow_clients",
+            f"{self.live_server_url}/about/author/",
+            "--clients", "3",
+            "--delay", "0.2",
+            "--probes", "2",
+            stdout=out
+        )
+        self.assertIn("ответов им: 3", out.getvalue())
+        self.assertIn("обычные запросы: 2/2", out.getvalue())
+
+
+@override_settings(EVENTS_POLL_INTERVAL=0.01)
+class EventBrokerTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_brokers_filter_channels_and_resume(self):
+        """Брокер отдаёт события нужных каналов после позиции."""
+        for broker in (LocalBroker(), CacheBroker()):
+            with self.subTest(broker=type(broker).__name__):
+                first = broker.publish("index", {"id": 1})
+                broker.publish("group:1", {"id": 2})
+                broker.publish("index", {"id": 3})
+
+                position, events = broker.listen({"index"}, first - 1, 0)
+                self.assertEqual(
+                    [event.data for event in events], [{"id": 1}, {"id": 3}]
+                )
+                self.assertEqual(broker.listen({"index"}, position, 0), (
+                    position, []
+                ))
+
+    def test_listener_wakes_on_publish(self):
+        """Ожидающий слушатель просыпается при публикации."""
+        broker = LocalBroker()
+        timer = threading.Timer(0.05, broker.publish, ("index", {"id": 1}))
+        timer.start()
+        self.addCleanup(timer.join)
+        _, events = broker.listen({"index"}, None, 5)
+        self.assertEqual([event.data for event in events], [{"id": 1}])
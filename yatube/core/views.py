@@ -1,4 +1,10 @@
+from django.conf import settings
+from django.http import Http404
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from core.profiling import registry
 
 
 def page_not_found(request, exception):
@@ -11,3 +17,32 @@ def csrf_failure(request, reason=''):
 
 def error_500(request, reason=''):
     return render(request, "core/500.html")
+
+
+def metrics_allowed(request):
+    """Метрики видны staff и по токену settings.METRICS_TOKEN.
+
+    Токен передаётся в заголовке Authorization: Bearer <токен>.
+    Доступ по INTERNAL_IPS включается METRICS_ALLOW_INTERNAL_IPS:
+    за прокси на localhost REMOTE_ADDR у всех запросов 127.0.0.1.
+    """
+    if request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(
+        request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"
+    ):
+        return True
+    return (
+        settings.METRICS_ALLOW_INTERNAL_IPS
+        and request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
+    )
+
+
+def metrics(request):
+    """Метрики профилирования в текстовом формате Prometheus."""
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4"
+    )
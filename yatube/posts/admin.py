@@ -3,6 +3,7 @@ from django.contrib import admin
 from .models import Comment
 from .models import Group
 from .models import Post
+from .search import get_search_backend
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -17,6 +18,12 @@ class PostAdmin(admin.ModelAdmin):
     # Пустая строка
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по тому же индексу, что и страница поиска, а не LIKE
+        if not search_term:
+            return queryset, False
+        return get_search_backend().filter(queryset, search_term), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('id', 'text', 'author', 'post', 'created')
@@ -0,0 +1,362 @@
+import json
+import re
+from functools import wraps
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_POST
+
+from posts.bulk import bulk_create_with_ids
+from posts.bulk import comments_added
+from posts.bulk import follows_added
+from posts.cache import conditional_page
+from posts.cache import edge_cache
+from posts.cache import group_scope
+from posts.cache import index_scope
+from posts.cache import profile_scope
+from posts.forms import CommentForm
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+from posts.timeline import user_timeline
+from posts.utils import COUNT_POST_PER_PAGE
+from posts.utils import CURSOR_PARAM
+from posts.utils import FEED_ORDERING
+from posts.utils import CursorPaginator
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, без него ответы сжимает gzip
+    brotli = None
+
+API_MAX_LIMIT = 100
+# Сколько операций принимает один пакетный запрос
+API_MAX_BATCH = 100
+FOLLOW_ACTIONS = ("follow", "unfollow")
+# Ответы короче не сжимаются, как и в GZipMiddleware
+MIN_COMPRESS_LENGTH = 200
+# Поля поста в API и выражения values(), которыми они читаются
+POST_FIELDS = dict(
+    id=F("id"),
+    text=F("text"),
+    pub_date=F("pub_date"),
+    updated=F("updated"),
+    author=F("author__username"),
+    group=F("group__slug"),
+    image=F("image"),
+    thumbnail=F("card_thumbnail"),
+    comment_count=F("comment_count"),
+)
+# Хранятся путями в хранилище и отдаются ссылками
+FILE_FIELDS = ("image",)
+SORT_FIELDS = tuple(name.lstrip("-") for name in FEED_ORDERING)
+BR_RE = re.compile(r"\bbr\b")
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def compress(view):
+    """Сжимает ответ brotli, если клиент его принимает, иначе gzip."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        accepted = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if (
+            brotli is None
+            or not BR_RE.search(accepted)
+            or response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < MIN_COMPRESS_LENGTH
+        ):
+            return response
+        response.content = brotli.compress(response.content)
+        response["Content-Length"] = str(len(response.content))
+        response["Content-Encoding"] = "br"
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+    return gzip_page(wrapper)
+
+
+def api_view(view):
+    """Превращает ApiError представления в JSON с кодом ошибки."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse(dict(error=str(error)), status=error.status)
+    return compress(wrapper)
+
+
+def requested_fields(request):
+    """Поля из параметра fields; без него отдаются все."""
+    fields = request.GET.get("fields")
+    if not fields:
+        return list(POST_FIELDS)
+    fields = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if unknown or not fields:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def requested_limit(request):
+    try:
+        limit = int(request.GET.get("limit", COUNT_POST_PER_PAGE))
+    except ValueError:
+        raise ApiError("limit должен быть числом")
+    return min(max(limit, 1), API_MAX_LIMIT)
+
+
+def post_rows(queryset, fields):
+    """values() постов: поля сортировки для курсора и запрошенные.
+
+    Запрошенные поля выбираются под псевдонимами с «_», чтобы
+    не пересекаться с полями модели; JOIN к автору и группе
+    появляется, только если их поля запрошены.
+    """
+    return queryset.values(*SORT_FIELDS, **{
+        f"_{name}": POST_FIELDS[name] for name in fields
+    })
+
+
+def serialize(rows, fields):
+    results = []
+    for row in rows:
+        item = {name: row[f"_{name}"] for name in fields}
+        for name in FILE_FIELDS:
+            if name in item:
+                item[name] = (
+                    default_storage.url(item[name]) if item[name] else None
+                )
+        if "thumbnail" in item:
+            item["thumbnail"] = item["thumbnail"] or None
+        results.append(item)
+    return results
+
+
+def feed_response(request, queryset):
+    """Страница ленты по курсору без создания объектов моделей."""
+    fields = requested_fields(request)
+    paginator = CursorPaginator(
+        post_rows(queryset, fields), requested_limit(request)
+    )
+    page = paginator.get_page(request.GET.get(CURSOR_PARAM))
+    return JsonResponse(dict(
+        results=serialize(page, fields),
+        next_cursor=page.next_cursor,
+        previous_cursor=page.previous_cursor,
+    ))
+
+
+@api_view
+@edge_cache
+@conditional_page(index_scope)
+def posts(request):
+    return feed_response(request, Post.objects.all())
+
+
+@api_view
+@edge_cache
+@conditional_page(group_scope)
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        "id", flat=True
+    ).first()
+    if group_id is None:
+        raise ApiError("Группа не найдена", status=404)
+    return feed_response(request, Post.objects.filter(group_id=group_id))
+
+
+@api_view
+@edge_cache
+@conditional_page(profile_scope)
+def profile_posts(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        "id", flat=True
+    ).first()
+    if author_id is None:
+        raise ApiError("Пользователь не найден", status=404)
+    return feed_response(request, Post.objects.filter(author_id=author_id))
+
+
+@api_view
+def follow_posts(request):
+    """Лента подписок: курсор идёт по записям ленты пользователя."""
+    if not request.user.is_authenticated:
+        raise ApiError("Нужна авторизация", status=401)
+    fields = requested_fields(request)
+    paginator = CursorPaginator(
+        user_timeline(request.user).values(*SORT_FIELDS, "post"),
+        requested_limit(request)
+    )
+    page = paginator.get_page(request.GET.get(CURSOR_PARAM))
+    post_ids = [entry["post"] for entry in page]
+    rows = {
+        row["id"]: row
+        for row in post_rows(Post.objects.filter(pk__in=post_ids), fields)
+    }
+    return JsonResponse(dict(
+        results=serialize(
+            [rows[post_id] for post_id in post_ids if post_id in rows],
+            fields
+        ),
+        next_cursor=page.next_cursor,
+        previous_cursor=page.previous_cursor,
+    ))
+
+
+def batch_items(request, key):
+    """Список операций из JSON-тела запроса {key: [...]}."""
+    if not request.user.is_authenticated:
+        raise ApiError("Нужна авторизация", status=401)
+    try:
+        items = json.loads(request.body)[key]
+    except (ValueError, TypeError, KeyError):
+        raise ApiError(f"Ожидается JSON вида {{\"{key}\": [...]}}")
+    if not isinstance(items, list) or not all(
+        isinstance(item, dict) for item in items
+    ):
+        raise ApiError(f"{key} должен быть списком объектов")
+    if len(items) > API_MAX_BATCH:
+        raise ApiError(f"Не больше {API_MAX_BATCH} операций за запрос")
+    return items
+
+
+def item_error(message):
+    return dict(status="error", error=message)
+
+
+def item_value(item, name, kind):
+    """Поле операции, если в JSON у него нужный тип, иначе None.
+
+    Проверяется точный тип: true не должен сойти за пост 1.
+    """
+    value = item.get(name)
+    return value if type(value) is kind else None
+
+
+@api_view
+@require_POST
+def comments_batch(request):
+    """Пакет комментариев: {"comments": [{"post": id, "text": ...}]}.
+
+    Посты проверяются одним запросом IN, комментарии пишутся
+    одним bulk_create в общей транзакции. Результат — по элементу
+    на каждый комментарий в том же порядке.
+    """
+    items = batch_items(request, "comments")
+    post_ids = {item_value(item, "post", int) for item in items}
+    existing = set(
+        Post.objects.filter(pk__in=post_ids - {None}).order_by().values_list(
+            "id", flat=True
+        )
+    )
+
+    results, comments = [], []
+    for item in items:
+        post_id = item_value(item, "post", int)
+        form = CommentForm(item)
+        if post_id is None:
+            results.append(item_error("post должен быть целым числом"))
+        elif item_value(item, "text", str) is None:
+            results.append(item_error("text должен быть строкой"))
+        elif post_id not in existing:
+            results.append(item_error("Пост не найден"))
+        elif not form.is_valid():
+            results.append(item_error(" ".join(
+                message for messages in form.errors.values()
+                for message in messages
+            )))
+        else:
+            comment = form.save(commit=False)
+            comment.author = request.user
+            comment.post_id = post_id
+            comments.append(comment)
+            results.append(comment)
+
+    if comments:
+        with transaction.atomic():
+            bulk_create_with_ids(Comment, comments)
+            comments_added(comments)
+    return JsonResponse(dict(results=[
+        dict(status="created", id=result.pk)
+        if isinstance(result, Comment) else result
+        for result in results
+    ]))
+
+
+@api_view
+@require_POST
+def follows_batch(request):
+    """Пакет подписок: {"follows": [{"author": username, "action": ...}]}.
+
+    action — follow или unfollow. Операции применяются по порядку,
+    в базу пишется только итог: новые подписки одним bulk_create,
+    отменённые одним DELETE.
+    """
+    items = batch_items(request, "follows")
+    usernames = {item_value(item, "author", str) for item in items}
+    authors = dict(User.objects.filter(
+        username__in=usernames - {None}
+    ).values_list("username", "id"))
+    existing = set(Follow.objects.filter(
+        user=request.user, author_id__in=authors.values()
+    ).values_list("author_id", flat=True))
+
+    following = set(existing)
+    results = []
+    for item in items:
+        username = item_value(item, "author", str)
+        author_id = authors.get(username)
+        action = item_value(item, "action", str)
+        if action not in FOLLOW_ACTIONS:
+            results.append(
+                item_error("action должен быть follow или unfollow")
+            )
+        elif username is None:
+            results.append(item_error("author должен быть строкой"))
+        elif author_id is None:
+            results.append(item_error("Автор не найден"))
+        elif author_id == request.user.pk:
+            results.append(item_error("Нельзя подписаться на себя"))
+        elif (action == "follow") == (author_id in following):
+            results.append(dict(status="unchanged"))
+        else:
+            if action == "follow":
+                following.add(author_id)
+            else:
+                following.discard(author_id)
+            results.append(dict(status=f"{action}ed"))
+
+    usernames = {author_id: name for name, author_id in authors.items()}
+    created = following - existing
+    with transaction.atomic():
+        Follow.objects.bulk_create(
+            [
+                Follow(user=request.user, author_id=author_id)
+                for author_id in created
+            ],
+            ignore_conflicts=True
+        )
+        follows_added(request.user.pk, {
+            author_id: usernames[author_id] for author_id in created
+        })
+        # Отписки проходят через сигналы удаления
+        Follow.objects.filter(
+            user=request.user, author_id__in=existing - following
+        ).delete()
+    return JsonResponse(dict(results=results))
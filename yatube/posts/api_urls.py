@@ -0,0 +1,44 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api_v1'
+
+urlpatterns = [
+    # Лента главной страницы
+    path(
+        'posts/',
+        api.posts,
+        name='posts'
+    ),
+    # Лента группы
+    path(
+        'groups/<slug:slug>/posts/',
+        api.group_posts,
+        name='group_posts'
+    ),
+    # Лента автора
+    path(
+        'profiles/<str:username>/posts/',
+        api.profile_posts,
+        name='profile_posts'
+    ),
+    # Лента подписок
+    path(
+        'follow/posts/',
+        api.follow_posts,
+        name='follow_posts'
+    ),
+    # Пакет комментариев
+    path(
+        'comments/batch/',
+        api.comments_batch,
+        name='comments_batch'
+    ),
+    # Пакет подписок и отписок
+    path(
+        'follows/batch/',
+        api.follows_batch,
+        name='follows_batch'
+    )
+]
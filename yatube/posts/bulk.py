@@ -0,0 +1,166 @@
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+
+from posts.cache import bump_feed_versions
+from posts.cache import group_scope
+from posts.cache import index_scope
+from posts.cache import post_scope
+from posts.cache import profile_scope
+from posts.counters import change_comment_count
+from posts.counters import change_profile_counters
+from posts.counters import reconcile_comment_counts
+from posts.counters import reconcile_profiles
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+from posts.search import get_search_backend
+from posts.timeline import backfill_author
+from posts.timeline import rebuild_timeline
+
+BATCH_SIZE = 500
+
+
+@contextmanager
+def explicit_dates(model, *field_names):
+    """Отключает auto_now и auto_now_add у полей модели.
+
+    Нужен массовой загрузке, чтобы сохранить даты из источника.
+    Меняет поля модели на уровне процесса, поэтому подходит
+    только для management-команд.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def bulk_create_with_ids(model, objects):
+    """bulk_create, после которого у объектов есть id.
+
+    Django 2.2 на SQLite не получает id из bulk_create, а без них
+    нельзя ни связать объекты, ни сообщить id клиенту. Тогда id
+    читаются сразу после INSERT в той же транзакции: она уже держит
+    блокировку записи SQLite, поэтому последние строки таблицы —
+    только что вставленные, и AUTOINCREMENT выдал им id по порядку
+    и не повторяя id удалённых строк. Вызывается внутри atomic().
+    """
+    model.objects.bulk_create(objects)
+    if connection.features.can_return_ids_from_bulk_insert or not objects:
+        return
+    ids = model.objects.order_by("-id").values_list(
+        "id", flat=True
+    )[:len(objects)]
+    for obj, pk in zip(objects, reversed(ids)):
+        obj.pk = pk
+
+
+def comments_added(comments):
+    """Делает для комментариев из bulk_create то же, что сигналы."""
+    per_post = Counter(comment.post_id for comment in comments)
+    for post_id, count in per_post.items():
+        change_comment_count(post_id, count)
+    if per_post:
+        bump_feed_versions(*(post_scope(post_id) for post_id in per_post))
+
+
+def follows_added(user_id, authors):
+    """Делает для подписок из bulk_create то же, что сигналы.
+
+    authors — словарь id автора → username.
+    """
+    if not authors:
+        return
+    change_profile_counters(user_id, following_count=len(authors))
+    for author_id in authors:
+        change_profile_counters(author_id, follower_count=1)
+        backfill_author(user_id, author_id)
+    bump_feed_versions(
+        *(profile_scope(username) for username in authors.values())
+    )
+
+
+def invalidate_all_feeds():
+    """Сбрасывает кеш главной, всех групп и всех профилей."""
+    bump_feed_versions(index_scope())
+    for model, field, scope in (
+        (Group, "slug", group_scope),
+        (User, "username", profile_scope),
+    ):
+        scopes = []
+        values = model.objects.values_list(field, flat=True)
+        for value in values.iterator(chunk_size=BATCH_SIZE):
+            scopes.append(scope(value))
+            if len(scopes) >= BATCH_SIZE:
+                bump_feed_versions(*scopes)
+                scopes = []
+        if scopes:
+            bump_feed_versions(*scopes)
+
+
+def chunked(values, size=BATCH_SIZE):
+    """Делит значения на списки не длиннее size для запросов IN."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def refresh_imported(post_ids, user_ids):
+    """Пересчитывает после загрузки только то, что она затронула.
+
+    post_ids — новые посты, user_ids — их авторы и авторы
+    комментариев к ним. Сверяются профили этих пользователей,
+    счётчики комментариев и поисковый индекс этих постов,
+    собираются заново ленты подписчиков их авторов и сбрасывается
+    кеш главной и страниц этих авторов и групп.
+    """
+    for chunk in chunked(user_ids):
+        reconcile_profiles(User.objects.filter(pk__in=chunk))
+
+    backend = get_search_backend()
+    author_ids = set()
+    scopes = {index_scope()}
+    for chunk in chunked(post_ids):
+        posts = Post.objects.filter(pk__in=chunk)
+        reconcile_comment_counts(posts)
+        backend.index(posts.only("id", "text"))
+        for author_id, username, slug in posts.values_list(
+            "author_id", "author__username", "group__slug"
+        ).distinct():
+            author_ids.add(author_id)
+            scopes.add(profile_scope(username))
+            if slug is not None:
+                scopes.add(group_scope(slug))
+
+    followers = set()
+    for chunk in chunked(author_ids):
+        followers.update(Follow.objects.filter(
+            author_id__in=chunk
+        ).values_list("user", flat=True))
+    for user_id in followers:
+        rebuild_timeline(user_id)
+    for chunk in chunked(scopes):
+        bump_feed_versions(*chunk)
+
+
+def refresh_denormalized():
+    """Пересчитывает всё, что обычно поддерживают сигналы.
+
+    bulk_create сигналов не посылает, поэтому после массовой
+    загрузки счётчики, ленты подписок, поисковый индекс и кеш
+    страниц приводятся в порядок здесь.
+    """
+    reconcile_profiles()
+    reconcile_comment_counts()
+    user_ids = Follow.objects.values_list("user", flat=True).distinct()
+    for user_id in user_ids.iterator():
+        rebuild_timeline(user_id)
+    get_search_backend().rebuild()
+    invalidate_all_feeds()
@@ -0,0 +1,200 @@
+import hashlib
+import random
+import time
+from datetime import datetime
+from datetime import timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+
+from core.routers import use_primary
+from posts.consts import EDGE_CACHE_TIMEOUT
+from posts.consts import FEED_CACHE_JITTER
+from posts.consts import VARIABLE_FOR_CACHE_VALUE
+from posts.models import Post
+
+VERSION_KEY = "feed_version:{}"
+
+
+def index_scope():
+    return "index"
+
+
+def group_scope(slug):
+    return f"group:{slug}"
+
+
+def profile_scope(username):
+    return f"profile:{username}"
+
+
+def post_scope(post_id):
+    return f"post:{post_id}"
+
+
+def _now_version():
+    return int(time.time() * 1000)
+
+
+def feed_version(scope):
+    """Текущая версия страниц области кеша.
+
+    Версия — отметка времени последнего изменения в миллисекундах.
+    Если ключ версии вытеснен из кеша, новая версия заведомо больше
+    всех прежних, поэтому устаревшие страницы не всплывут.
+    """
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        version = _now_version()
+        cache.add(key, version, None)
+        # Кеш без хранения (DummyCache) каждый раз даёт новую версию
+        version = cache.get(key, version)
+    return version
+
+
+def bump_feed_versions(*scopes):
+    """Инвалидирует все закешированные страницы указанных областей."""
+    keys = [VERSION_KEY.format(scope) for scope in set(scopes)]
+    current = cache.get_many(keys)
+    now = _now_version()
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys}, None
+    )
+
+
+def cache_feed(scope):
+    """Кеширует страницу ленты под ключом с версией её области.
+
+    scope получает именованные аргументы view и возвращает имя
+    области. Сигналы моделей повышают версию области, поэтому
+    страница живёт в кеше долго и не отдаётся устаревшей. Срок
+    хранения слегка размыт, чтобы страницы не истекали разом.
+    Страница, которой нет в кеше, собирается по основной базе:
+    отстающая реплика дала бы страницу без только что записанного,
+    и она жила бы в кеше под новой версией. Клиент с cookie
+    settings.REPLICA_STICKY_COOKIE кеш обходит.
+    Страница, читавшая сессию, зависит от пользователя и получает
+    Vary: Cookie до записи в кеш: SessionMiddleware добавит его
+    уже после cache_page, и копия досталась бы всем.
+    """
+    def decorator(view):
+        def on_primary(request, *args, **kwargs):
+            with use_primary():
+                response = view(request, *args, **kwargs)
+            session = getattr(request, "session", None)
+            if session is not None and session.accessed:
+                patch_vary_headers(response, ("Cookie",))
+            return response
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.REPLICA_STICKY_COOKIE in request.COOKIES:
+                return view(request, *args, **kwargs)
+            name = scope(**kwargs)
+            timeout = VARIABLE_FOR_CACHE_VALUE + random.randint(
+                0, FEED_CACHE_JITTER
+            )
+            cached_view = cache_page(
+                timeout, key_prefix=f"{name}:{feed_version(name)}"
+            )(on_primary)
+            response = cached_view(request, *args, **kwargs)
+            # Срок кеша на сервере не должен становиться сроком
+            # кеша в браузере — иначе браузер не увидит инвалидацию
+            patch_cache_control(response, max_age=0)
+            if response.has_header("Expires"):
+                del response["Expires"]
+            return response
+        return wrapper
+    return decorator
+
+
+def post_page_scopes(post_id):
+    """Области, от которых зависит страница поста.
+
+    Кроме самого поста и комментариев, на странице выводятся
+    счётчик постов автора и группа.
+    """
+    post = Post.objects.filter(pk=post_id).values_list(
+        "author__username", "group__slug"
+    ).first()
+    if post is None:
+        return []
+    username, slug = post
+    scopes = [post_scope(post_id), profile_scope(username)]
+    if slug is not None:
+        scopes.append(group_scope(slug))
+    return scopes
+
+
+def conditional_page(scopes):
+    """Отвечает 304, если страница не менялась с прошлого запроса.
+
+    scopes получает именованные аргументы view и возвращает имя
+    области или список областей. ETag собирается из их версий
+    и адреса страницы, Last-Modified — из последней версии; сама
+    страница при этом не строится. Страница не должна зависеть
+    от пользователя: персональное подгружается фрагментами.
+    """
+    def versions(request, kwargs):
+        # etag и last_modified вызываются для одного запроса подряд
+        if not hasattr(request, "_page_versions"):
+            names = scopes(**kwargs)
+            if isinstance(names, str):
+                names = [names]
+            request._page_versions = [feed_version(name) for name in names]
+        return request._page_versions
+
+    def etag(request, *args, **kwargs):
+        page_versions = versions(request, kwargs)
+        if not page_versions:
+            return None
+        page = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return "-".join(map(str, page_versions)) + f"-{page[:16]}"
+
+    def last_modified(request, *args, **kwargs):
+        page_versions = versions(request, kwargs)
+        if not page_versions:
+            return None
+        return datetime.fromtimestamp(
+            max(page_versions) / 1000, tz=timezone.utc
+        )
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def edge_cache(view):
+    """Разрешает общим кешам (nginx, Varnish) хранить страницу.
+
+    Браузер каждый раз перепроверяет страницу по ETag, а прокси
+    отдаёт её сам EDGE_CACHE_TIMEOUT секунд. Если страница всё же
+    обратилась к сессии или CSRF-токену, middleware добавят
+    Vary: Cookie, и она остаётся приватной. Приватна и страница
+    для клиента, недавно писавшего в базу (cookie
+    settings.REPLICA_STICKY_COOKIE): она читается из основной базы
+    и может быть новее общей копии.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code not in (200, 304):
+            return response
+        session = getattr(request, "session", None)
+        personal = (
+            session is not None and session.accessed
+            or request.META.get("CSRF_COOKIE_USED")
+            or settings.REPLICA_STICKY_COOKIE in request.COOKIES
+        )
+        if personal:
+            patch_cache_control(response, private=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=0, s_maxage=EDGE_CACHE_TIMEOUT
+            )
+        return response
+    return wrapper
@@ -1,5 +1,15 @@
 # Константы models
 FIRST_POST_CHARACTERS = 15
+# Миниатюры изображения поста: поле с URL и размер для шаблонов
+THUMBNAIL_SIZES = {
+    "card_thumbnail": "900x300",
+    "detail_thumbnail": "960x339",
+}
 
 # Константы views
-VARIABLE_FOR_CACHE_VALUE = 20
+# Страницы лент инвалидируются сигналами, поэтому живут в кеше часами
+VARIABLE_FOR_CACHE_VALUE = 60 * 60 * 6
+# Разброс срока хранения, чтобы страницы не истекали одновременно
+FEED_CACHE_JITTER = 60 * 10
+# Сколько секунд общий прокси-кеш отдаёт страницу без обращения к Django
+EDGE_CACHE_TIMEOUT = 60
@@ -0,0 +1,114 @@
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Post
+from posts.models import Profile
+from posts.models import User
+
+BATCH_SIZE = 500
+PROFILE_COUNTERS = ("post_count", "follower_count", "following_count")
+
+
+def change_profile_counters(user_id, **deltas):
+    """Атомарно меняет счётчики профиля выражениями F.
+
+    Если профиля ещё нет, при увеличении он создаётся сразу
+    с пересчитанными значениями.
+    """
+    # Счётчик не уходит в минус: разошедшиеся значения чинит
+    # команда reconcile_counters
+    updated = Profile.objects.filter(user_id=user_id, **{
+        f"{field}__gte": -delta
+        for field, delta in deltas.items() if delta < 0
+    }).update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        reconcile_profiles(User.objects.filter(pk=user_id))
+
+
+def change_comment_count(post_id, delta):
+    Post.objects.filter(
+        pk=post_id, comment_count__gte=-min(delta, 0)
+    ).update(comment_count=F("comment_count") + delta)
+
+
+def _count(queryset, field):
+    """Подзапрос COUNT(*) по связанной таблице для OuterRef("pk")."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef("pk")}).order_by().values(
+            field
+        ).annotate(total=Count("*")).values("total")
+    ), 0)
+
+
+def reconcile_profiles(users=None):
+    """Сверяет счётчики профилей с данными и исправляет расхождения.
+
+    Возвращает число исправленных или созданных профилей.
+    """
+    if users is None:
+        users = User.objects.all()
+    users = users.select_related("profile").annotate(
+        actual_post_count=_count(Post.objects, "author"),
+        actual_follower_count=_count(Follow.objects, "author"),
+        actual_following_count=_count(Follow.objects, "user"),
+    ).filter(
+        Q(profile__isnull=True)
+        | ~Q(profile__post_count=F("actual_post_count"))
+        | ~Q(profile__follower_count=F("actual_follower_count"))
+        | ~Q(profile__following_count=F("actual_following_count"))
+    )
+
+    fixed = 0
+    created, changed = [], []
+    for user in users.iterator(chunk_size=BATCH_SIZE):
+        actual = {
+            field: getattr(user, f"actual_{field}")
+            for field in PROFILE_COUNTERS
+        }
+        if not hasattr(user, "profile"):
+            created.append(Profile(user=user, **actual))
+        else:
+            for field, value in actual.items():
+                setattr(user.profile, field, value)
+            changed.append(user.profile)
+        if len(created) + len(changed) >= BATCH_SIZE:
+            fixed += _save_profiles(created, changed)
+            created, changed = [], []
+    return fixed + _save_profiles(created, changed)
+
+
+def _save_profiles(created, changed):
+    Profile.objects.bulk_create(created, ignore_conflicts=True)
+    Profile.objects.bulk_update(changed, PROFILE_COUNTERS)
+    return len(created) + len(changed)
+
+
+def reconcile_comment_counts(posts=None):
+    """Сверяет Post.comment_count с комментариями."""
+    if posts is None:
+        posts = Post.objects.all()
+    posts = posts.annotate(
+        actual_comment_count=_count(Comment.objects, "post")
+    ).exclude(
+        comment_count=F("actual_comment_count")
+    ).only("id", "comment_count")
+
+    fixed = 0
+    changed = []
+    for post in posts.iterator(chunk_size=BATCH_SIZE):
+        post.comment_count = post.actual_comment_count
+        changed.append(post)
+        if len(changed) >= BATCH_SIZE:
+            Post.objects.bulk_update(changed, ["comment_count"])
+            fixed += len(changed)
+            changed = []
+    Post.objects.bulk_update(changed, ["comment_count"])
+    return fixed + len(changed)
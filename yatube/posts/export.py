@@ -0,0 +1,105 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv",
+}
+# Набор данных: модель, поле владельца и выгружаемые колонки
+DATASETS = {
+    "posts": (Post, "author", dict(
+        id=F("id"),
+        text=F("text"),
+        pub_date=F("pub_date"),
+        updated=F("updated"),
+        author=F("author__username"),
+        group=F("group__slug"),
+        image=F("image"),
+    )),
+    "comments": (Comment, "author", dict(
+        id=F("id"),
+        post=F("post_id"),
+        text=F("text"),
+        created=F("created"),
+        author=F("author__username"),
+    )),
+    "follows": (Follow, "user", dict(
+        user=F("user__username"),
+        author=F("author__username"),
+    )),
+    "groups": (Group, None, dict(
+        id=F("id"),
+        title=F("title"),
+        slug=F("slug"),
+        description=F("description"),
+    )),
+}
+
+
+def _json_default(value):
+    # Даты с микросекундами, чтобы выгрузка читалась обратно без потерь
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return DjangoJSONEncoder().default(value)
+
+
+def dataset_rows(name, user=None):
+    """Строки набора данных словарями, потоком по id.
+
+    Если передан user, выгружается только его содержимое;
+    группы общие и выгружаются целиком.
+    """
+    model, owner, columns = DATASETS[name]
+    queryset = model.objects.order_by("id")
+    if user is not None and owner is not None:
+        queryset = queryset.filter(**{owner: user})
+    # Ключи values() не должны совпадать с полями модели
+    rows = queryset.values(**{
+        f"_{column}": expression for column, expression in columns.items()
+    })
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {column: row[f"_{column}"] for column in columns}
+
+
+class _Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_lines(datasets, file_format, user=None):
+    """Строки выгрузки в формате jsonl или csv.
+
+    В JSONL каждая строка — объект с полем type. В CSV колонки
+    всех наборов объединены, первая колонка — type.
+    """
+    if file_format == "jsonl":
+        for name in datasets:
+            for row in dataset_rows(name, user):
+                yield json.dumps(
+                    dict(type=name, **row),
+                    default=_json_default,
+                    ensure_ascii=False
+                ) + "\n"
+        return
+
+    header = ["type"]
+    for name in datasets:
+        header += [
+            column for column in DATASETS[name][2] if column not in header
+        ]
+    writer = csv.DictWriter(_Echo(), header)
+    yield writer.writerow(dict(zip(header, header)))
+    for name in datasets:
+        for row in dataset_rows(name, user):
+            yield writer.writerow(dict(type=name, **row))
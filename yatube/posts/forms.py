@@ -28,6 +28,18 @@ class PostForm(forms.ModelForm):
             )
         return data
 
+    def clean(self):
+        cleaned_data = super().clean()
+        # Отклонённая обработчиком загрузки картинка обрезана, и поле
+        # сообщает лишь «загрузите правильное изображение»: подменяем
+        # сообщение настоящей причиной
+        image = self.files.get(self.add_prefix("image"))
+        error = getattr(image, "upload_error", None)
+        if error:
+            self.errors.pop("image", None)
+            self.add_error("image", error)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
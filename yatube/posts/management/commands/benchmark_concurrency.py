@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import OperationalError
+from django.db import connection
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from posts.management.commands.benchmark_views import DUMMY_CACHES
+from posts.management.commands.benchmark_views import SAMPLE_SIZE
+from posts.management.commands.benchmark_views import percentile
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+
+# Режимы замера: настройки из settings и журнал SQLite по умолчанию
+MODES = ("tuned", "baseline")
+BASELINE_PRAGMAS = {"journal_mode": "delete"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет пропускную способность лент при параллельных "
+        "чтении и записи с настройками SQLITE_PRAGMAS и без них"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--readers",
+            type=int,
+            default=8,
+            help="Потоки, читающие ленты"
+        )
+        parser.add_argument(
+            "--writers",
+            type=int,
+            default=2,
+            help="Потоки, пишущие посты и комментарии"
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=10,
+            help="Длительность замера каждого режима, секунды"
+        )
+        parser.add_argument(
+            "--mode",
+            choices=MODES,
+            action="append",
+            help="Замеряемый режим (по умолчанию оба)"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Замер предназначен для SQLite")
+        if connection.is_in_memory_db():
+            raise CommandError("Нужна база SQLite в файле, а не в памяти")
+        self.random = random.Random(options["seed"])
+        self.urls = self.feed_urls()
+        self.post_ids = list(
+            Post.objects.values_list("id", flat=True)[:SAMPLE_SIZE]
+        )
+        self.writers = list(User.objects.all()[:options["writers"]])
+        if not self.urls or not self.post_ids:
+            raise CommandError(
+                "Нет данных для замера: заполните базу командой seed_data"
+            )
+
+        for mode in options["mode"] or MODES:
+            pragmas = (
+                settings.SQLITE_PRAGMAS if mode == "tuned"
+                else BASELINE_PRAGMAS
+            )
+            # Кеш страниц скрыл бы конкуренцию за базу
+            with override_settings(
+                SQLITE_PRAGMAS=pragmas, CACHES=DUMMY_CACHES
+            ):
+                stats = self.measure(
+                    options["readers"], options["duration"]
+                )
+            self.stdout.write(
+                f"{mode:8} журнал {stats['journal_mode']:6} "
+                f"чтений/с {stats['reads_per_second']:8.1f}  "
+                f"p95 {stats['read_p95_ms']:8.2f} мс  "
+                f"записей/с {stats['writes_per_second']:7.1f}  "
+                f"p95 {stats['write_p95_ms']:8.2f} мс  "
+                f"блокировок {stats['locked']}"
+            )
+        connections.close_all()
+
+    def feed_urls(self):
+        urls = [reverse("posts:index")]
+        urls += [
+            reverse("posts:group_list", args=[slug])
+            for slug in Group.objects.values_list(
+                "slug", flat=True
+            )[:SAMPLE_SIZE]
+        ]
+        urls += [
+            reverse("posts:profile", args=[username])
+            for username in User.objects.filter(
+                profile__post_count__gt=0
+            ).values_list("username", flat=True)[:SAMPLE_SIZE]
+        ]
+        return urls
+
+    def measure(self, readers, duration):
+        # Режим журнала меняется только без других соединений
+        connections.close_all()
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+
+        self.reads, self.writes = [], []
+        self.locked = 0
+        self.lock = threading.Lock()
+        deadline = time.monotonic() + duration
+        threads = [
+            threading.Thread(target=self.read_loop, args=(deadline,))
+            for _ in range(readers)
+        ] + [
+            threading.Thread(target=self.write_loop, args=(deadline, user))
+            for user in self.writers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return dict(
+            journal_mode=journal_mode,
+            reads_per_second=len(self.reads) / duration,
+            writes_per_second=len(self.writes) / duration,
+            read_p95_ms=percentile(self.reads or [0], 95),
+            write_p95_ms=percentile(self.writes or [0], 95),
+            locked=self.locked,
+        )
+
+    def timed(self, durations, request):
+        start = time.perf_counter()
+        try:
+            request()
+        except OperationalError:
+            with self.lock:
+                self.locked += 1
+            return
+        with self.lock:
+            durations.append((time.perf_counter() - start) * 1000)
+
+    def read_loop(self, deadline):
+        client = Client()
+        try:
+            while time.monotonic() < deadline:
+                url = self.random.choice(self.urls)
+                self.timed(self.reads, lambda: client.get(url))
+        finally:
+            connections.close_all()
+
+    def write_loop(self, deadline, user):
+        client = Client()
+        client.force_login(user)
+        try:
+            while time.monotonic() < deadline:
+                if self.random.random() < 0.8:
+                    url = reverse(
+                        "posts:add_comment",
+                        args=[self.random.choice(self.post_ids)]
+                    )
+                    data = {"text": "Комментарий замера"}
+                else:
+                    url = reverse("posts:post_create")
+                    data = {"text": "Пост замера"}
+                self.timed(self.writes, lambda: client.post(url, data))
+        finally:
+            connections.close_all()
@@ -0,0 +1,226 @@
+import json
+import math
+import random
+import statistics
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+
+PERCENTILES = (50, 95, 99)
+# Сколько разных групп, авторов, постов и читателей участвует в замере
+SAMPLE_SIZE = 100
+# Сколько первых страниц главной запрашивается
+INDEX_PAGES = 5
+DUMMY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+}
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержку и число SQL-запросов страниц постов "
+        "и сравнивает их с сохранённым базовым замером"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=100,
+            help="Число замеряемых запросов на каждую страницу"
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=5,
+            help="Число запросов на прогрев перед замером"
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Замерять без кеша страниц (DummyCache)"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output",
+            help="Файл, куда записать результаты в JSON"
+        )
+        parser.add_argument(
+            "--baseline",
+            help="JSON прошлого замера; регрессия завершает команду ошибкой"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Допустимый рост p95 относительно базового замера"
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        targets = self.targets()
+        if not targets:
+            raise CommandError(
+                "Нет данных для замера: заполните базу командой seed_data"
+            )
+
+        caches = DUMMY_CACHES if options["no_cache"] else None
+        with override_settings(CACHES=caches) if caches else nullcontext():
+            views = {
+                name: self.measure(
+                    name, pairs, options["requests"], options["warmup"]
+                )
+                for name, pairs in targets.items()
+            }
+        results = dict(
+            requests=options["requests"],
+            cache=not options["no_cache"],
+            views=views,
+        )
+
+        for name, stats in views.items():
+            self.stdout.write(
+                f"{name:14} p50 {stats['p50_ms']:8.2f} мс  "
+                f"p95 {stats['p95_ms']:8.2f} мс  "
+                f"p99 {stats['p99_ms']:8.2f} мс  "
+                f"запросов {stats['queries_max']}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(results, file, indent=2, ensure_ascii=False)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+            regressions = self.compare(
+                views, baseline["views"], options["tolerance"]
+            )
+            if regressions:
+                raise CommandError(
+                    "Регрессия относительно базового замера:\n"
+                    + "\n".join(regressions)
+                )
+            self.stdout.write(
+                self.style.SUCCESS("Регрессий относительно базы нет")
+            )
+
+    def targets(self):
+        """Пары (клиент, URL) для каждой замеряемой страницы."""
+        anonymous = Client()
+        targets = {}
+
+        if Post.objects.exists():
+            targets["index"] = [
+                (anonymous, f"{reverse('posts:index')}?page={page}")
+                for page in range(1, INDEX_PAGES + 1)
+            ]
+            # Та же первая страница через JSON API для сравнения с HTML
+            targets["api_index"] = [(anonymous, reverse("api_v1:posts"))]
+
+        slugs = Group.objects.filter(
+            posts__isnull=False
+        ).distinct().values_list("slug", flat=True)[:SAMPLE_SIZE]
+        targets["group_posts"] = [
+            (anonymous, reverse("posts:group_list", args=[slug]))
+            for slug in slugs
+        ]
+
+        usernames = User.objects.filter(
+            profile__post_count__gt=0
+        ).values_list("username", flat=True)[:SAMPLE_SIZE]
+        targets["profile"] = [
+            (anonymous, reverse("posts:profile", args=[username]))
+            for username in usernames
+        ]
+        targets["api_profile"] = [
+            (anonymous, reverse("api_v1:profile_posts", args=[username]))
+            for username in usernames
+        ]
+
+        last_id = Post.objects.aggregate(last=Max("id"))["last"] or 0
+        post_ids = Post.objects.filter(id__in=[
+            self.random.randint(1, last_id) for _ in range(SAMPLE_SIZE)
+        ]).values_list("id", flat=True) if last_id else []
+        targets["post_detail"] = [
+            (anonymous, reverse("posts:post_detail", args=[post_id]))
+            for post_id in post_ids
+        ]
+
+        targets["follow_index"] = []
+        followers = User.objects.filter(
+            pk__in=Follow.objects.values("user")
+        )[:SAMPLE_SIZE // 10]
+        for follower in followers:
+            client = Client()
+            client.force_login(follower)
+            targets["follow_index"].append(
+                (client, reverse("posts:follow_index"))
+            )
+        return {name: pairs for name, pairs in targets.items() if pairs}
+
+    def measure(self, name, targets, requests, warmup):
+        durations, queries = [], []
+        for number in range(warmup + requests):
+            client, url = self.random.choice(targets)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url)
+                duration = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(
+                    f"{name}: {url} вернул {response.status_code}"
+                )
+            if number >= warmup:
+                durations.append(duration * 1000)
+                queries.append(len(captured))
+
+        stats = {
+            f"p{percent}_ms": round(percentile(durations, percent), 3)
+            for percent in PERCENTILES
+        }
+        stats.update(
+            mean_ms=round(statistics.mean(durations), 3),
+            queries_mean=round(statistics.mean(queries), 2),
+            queries_max=max(queries),
+        )
+        return stats
+
+    def compare(self, views, baseline, tolerance):
+        regressions = []
+        for name, base in baseline.items():
+            current = views.get(name)
+            if current is None:
+                regressions.append(f"{name}: страница не замерена")
+                continue
+            limit = base["p95_ms"] * (1 + tolerance)
+            if current["p95_ms"] > limit:
+                regressions.append(
+                    f"{name}: p95 {current['p95_ms']} мс "
+                    f"> {base['p95_ms']} мс + {tolerance:.0%}"
+                )
+            if current["queries_max"] > base["queries_max"]:
+                regressions.append(
+                    f"{name}: запросов {current['queries_max']} "
+                    f"> {base['queries_max']}"
+                )
+        return regressions
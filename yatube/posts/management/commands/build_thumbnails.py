@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts.consts import THUMBNAIL_SIZES
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Строит недостающие миниатюры изображений постов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Перестроить миниатюры всех постов с изображением"
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="")
+        if not options["all"]:
+            missing = Q()
+            for field in THUMBNAIL_SIZES:
+                missing |= Q(**{field: ""})
+            posts = posts.filter(missing)
+        built = 0
+        for post_id in posts.values_list("id", flat=True).iterator():
+            try:
+                generate_thumbnails(post_id)
+            except Exception as error:
+                self.stderr.write(f"Пост {post_id}: {error}")
+                continue
+            built += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Обработано постов: {built}")
+        )
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+from posts.timeline import user_timeline
+from posts.utils import COMMENT_FIELDS
+from posts.utils import COMMENT_ORDERING
+from posts.utils import COUNT_COMMENTS_PER_PAGE
+from posts.utils import COUNT_POST_PER_PAGE
+from posts.utils import feed_queryset
+
+# Признаки плана, при которых запрос сортирует всю выборку
+SORT_MARKERS = ("USE TEMP B-TREE",)
+
+
+class Command(BaseCommand):
+    help = "Печатает EXPLAIN QUERY PLAN для запросов каждой ленты"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="Завершиться с ошибкой, если план содержит сортировку"
+        )
+
+    def handle(self, *args, **options):
+        sorted_feeds = []
+        for name, queryset in self.feed_querysets():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(plan)
+            if any(marker in plan for marker in SORT_MARKERS):
+                sorted_feeds.append(name)
+                self.stdout.write(self.style.WARNING("сортировка без индекса"))
+            self.stdout.write("")
+
+        if sorted_feeds and options["strict"]:
+            raise CommandError(
+                "Запросы сортируют выборку без индекса: "
+                + ", ".join(sorted_feeds)
+            )
+        if not sorted_feeds:
+            self.stdout.write(self.style.SUCCESS("Все ленты читают индекс"))
+
+    def feed_querysets(self):
+        """Запросы первой страницы каждой ленты, как их строят views."""
+        group = Group.objects.first()
+        author = User.objects.filter(posts__isnull=False).first()
+        follower = Follow.objects.values_list("user", flat=True).first()
+        post = Post.objects.first()
+
+        feeds = [("index", Post.objects.all())]
+        if group is not None:
+            feeds.append(("group_posts", group.posts.all()))
+        if author is not None:
+            feeds.append(("profile", author.posts.all()))
+        for name, post_list in feeds:
+            yield name, feed_queryset(post_list)[:COUNT_POST_PER_PAGE]
+
+        if follower is not None:
+            yield "follow_index", user_timeline(
+                follower
+            )[:COUNT_POST_PER_PAGE]
+
+        if post is not None:
+            yield "post_detail", Comment.objects.filter(
+                post=post
+            ).select_related("author").only(
+                *COMMENT_FIELDS
+            ).order_by(*COMMENT_ORDERING)[:COUNT_COMMENTS_PER_PAGE]
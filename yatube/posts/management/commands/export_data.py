@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from posts.export import DATASETS
+from posts.export import FORMATS
+from posts.export import export_lines
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = "Выгружает посты, комментарии, подписки и группы в JSONL или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=FORMATS, default="jsonl"
+        )
+        parser.add_argument(
+            "--data",
+            nargs="+",
+            choices=DATASETS,
+            default=list(DATASETS),
+            help="Наборы данных (по умолчанию все)"
+        )
+        parser.add_argument(
+            "--user",
+            help="Выгрузить только содержимое этого пользователя"
+        )
+        parser.add_argument(
+            "--output",
+            help="Файл выгрузки (по умолчанию stdout)"
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(
+                    f"Пользователь {options['user']} не найден"
+                )
+        lines = export_lines(options["data"], options["format"], user)
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(options["output"], "w", newline="") as file:
+            file.writelines(lines)
+        self.stderr.write(
+            self.style.SUCCESS(f"Выгрузка записана в {options['output']}")
+        )
@@ -0,0 +1,281 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.bulk import bulk_create_with_ids
+from posts.bulk import explicit_dates
+from posts.bulk import refresh_imported
+from posts.models import Comment
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+from posts.thumbnails import schedule_thumbnails
+
+FORMATS = ("jsonl", "csv")
+
+
+def parse_date(value):
+    """Дата ISO 8601 или None; некорректная дата — ValueError."""
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("дата должна быть строкой")
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"некорректная дата {value!r}")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует посты с комментариями из JSONL или CSV. "
+        "Каждая запись: text, author (username), group (slug), "
+        "pub_date (ISO 8601), image (путь в --images-dir); "
+        "в JSONL также comments — список {text, author, created}"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл JSONL или CSV")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Формат файла (по умолчанию по расширению)"
+        )
+        parser.add_argument(
+            "--images-dir",
+            default="",
+            help="Каталог, относительно которого указаны изображения"
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Потоки копирования изображений"
+        )
+        parser.add_argument(
+            "--create-authors",
+            action="store_true",
+            help="Создавать неизвестных авторов вместо пропуска записей"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or os.path.splitext(
+            path
+        )[1].lstrip(".").lower()
+        if file_format not in FORMATS:
+            raise CommandError(f"Неизвестный формат файла: {path}")
+        self.options = options
+        self.authors = {}
+        self.groups = {}
+        self.imported = self.comments = self.skipped = 0
+        # Авторы, созданные для текущей пачки: их профили
+        # создаёт пересчёт пачки
+        self.user_ids = set()
+        self.started = time.monotonic()
+
+        size = os.path.getsize(path)
+        with open(path, "rb") as file, ThreadPoolExecutor(
+            options["workers"]
+        ) as self.executor:
+            lines = (line.decode("utf-8") for line in file)
+            records = (
+                self.read_jsonl(lines) if file_format == "jsonl"
+                else csv.DictReader(lines)
+            )
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= options["batch_size"]:
+                    self.import_batch(batch)
+                    self.report(file.tell(), size)
+                    batch = []
+            self.import_batch(batch)
+            self.report(size, size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано постов: {self.imported}, "
+            f"комментариев: {self.comments}, пропущено: {self.skipped}"
+        ))
+
+    def read_jsonl(self, lines):
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                self.warn(f"строка {number}: некорректный JSON")
+
+    def warn(self, message):
+        self.skipped += 1
+        self.stderr.write(message)
+
+    def clean(self, record):
+        """Проверяет типы полей записи; плохая запись пропускается.
+
+        Возвращает запись с датами, разобранными в datetime, или None.
+        """
+        if not isinstance(record, dict):
+            self.warn("пропущена запись: ожидается объект")
+            return None
+        try:
+            for name in ("text", "author", "group", "image"):
+                value = record.get(name)
+                if value is not None and not isinstance(value, str):
+                    raise ValueError(f"{name} должен быть строкой")
+            comments = record.get("comments") or []
+            if not isinstance(comments, list):
+                raise ValueError("comments должен быть списком")
+            pub_date = parse_date(record.get("pub_date"))
+        except ValueError as error:
+            self.warn(
+                f"пропущен пост автора {record.get('author')!r}: {error}"
+            )
+            return None
+        return dict(
+            record,
+            pub_date=pub_date,
+            comments=list(filter(None, map(self.clean_comment, comments)))
+        )
+
+    def clean_comment(self, comment):
+        try:
+            if not isinstance(comment, dict):
+                raise ValueError("ожидается объект")
+            for name in ("text", "author"):
+                if not isinstance(comment.get(name), str):
+                    raise ValueError(f"{name} должен быть строкой")
+            return dict(comment, created=parse_date(comment.get("created")))
+        except ValueError as error:
+            self.warn(f"пропущен комментарий: {error}")
+            return None
+
+    def report(self, position, size):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"{position * 100 // max(size, 1)}%: постов {self.imported} "
+            f"({self.imported / max(elapsed, 0.001):.0f}/с)"
+        )
+
+    def resolve(self, records):
+        """Дополняет карты авторов и групп одним запросом на пачку."""
+        usernames = {record.get("author") for record in records}
+        for record in records:
+            usernames.update(
+                comment["author"] for comment in record["comments"]
+            )
+        usernames = {name for name in usernames if name} - set(self.authors)
+        self.authors.update(User.objects.filter(
+            username__in=usernames
+        ).values_list("username", "id"))
+        missing = usernames - set(self.authors)
+        if missing and self.options["create_authors"]:
+            User.objects.bulk_create(
+                [User(username=name) for name in missing],
+                ignore_conflicts=True
+            )
+            created = dict(User.objects.filter(
+                username__in=missing
+            ).values_list("username", "id"))
+            self.authors.update(created)
+            self.user_ids.update(created.values())
+
+        slugs = {
+            record.get("group") for record in records
+            if record.get("group")
+        } - set(self.groups)
+        self.groups.update(Group.objects.filter(
+            slug__in=slugs
+        ).values_list("slug", "id"))
+
+    def import_batch(self, records):
+        records = list(filter(None, map(self.clean, records)))
+        if not records:
+            return
+        self.resolve(records)
+        now = timezone.now()
+        posts, comments, images = [], [], []
+        for record in records:
+            author_id = self.authors.get(record.get("author"))
+            if not record.get("text") or author_id is None:
+                self.warn(
+                    f"пропущен пост автора {record.get('author')!r}: "
+                    f"нет текста или автора"
+                )
+                continue
+            pub_date = record["pub_date"] or now
+            post = Post(
+                text=record["text"],
+                author_id=author_id,
+                group_id=self.groups.get(record.get("group")),
+                pub_date=pub_date,
+                updated=pub_date,
+            )
+            posts.append(post)
+            if record.get("image"):
+                images.append((post, record["image"]))
+            for comment in record["comments"]:
+                comment_author = self.authors.get(comment["author"])
+                if not comment["text"] or comment_author is None:
+                    self.warn("пропущен комментарий без текста или автора")
+                    continue
+                comments.append(Comment(
+                    post=post,
+                    author_id=comment_author,
+                    text=comment["text"],
+                    created=comment["created"] or pub_date,
+                ))
+
+        # Изображения пачки копируются параллельно до вставки постов
+        for (post, _), name in zip(images, self.executor.map(
+            self.copy_image, [source for _, source in images]
+        )):
+            post.image = name
+
+        with transaction.atomic():
+            # Комментарии связываются с постами по их новым id
+            with explicit_dates(Post, "pub_date", "updated"):
+                bulk_create_with_ids(Post, posts)
+            for comment in comments:
+                comment.post_id = comment.post.pk
+            with explicit_dates(Comment, "created"):
+                Comment.objects.bulk_create(comments)
+        # Пачка пересчитывается сразу: id не копятся за весь импорт
+        self.user_ids.update(post.author_id for post in posts)
+        self.user_ids.update(comment.author_id for comment in comments)
+        refresh_imported([post.pk for post in posts], self.user_ids)
+        self.user_ids = set()
+        for post in posts:
+            schedule_thumbnails(post)
+        self.imported += len(posts)
+        self.comments += len(comments)
+
+    def copy_image(self, source):
+        path = os.path.join(self.options["images_dir"], source)
+        try:
+            with open(path, "rb") as file:
+                return default_storage.save(
+                    os.path.join(
+                        Post._meta.get_field("image").upload_to,
+                        os.path.basename(source)
+                    ),
+                    File(file)
+                )
+        except OSError:
+            self.stderr.write(f"не удалось скопировать изображение {path}")
+            return ""
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Пересобирает поисковый индекс постов"
+
+    def handle(self, *args, **options):
+        indexed = get_search_backend().rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Проиндексировано постов: {indexed}")
+        )
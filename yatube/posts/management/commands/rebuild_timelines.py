@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow
+from posts.models import TimelineEntry
+from posts.models import User
+from posts.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = "Пересобирает ленты подписок из таблицы подписок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames",
+            nargs="*",
+            help="Пользователи, чьи ленты пересобрать (по умолчанию все)"
+        )
+
+    def handle(self, *args, **options):
+        if options["usernames"]:
+            user_ids = User.objects.filter(
+                username__in=options["usernames"]
+            ).values_list("id", flat=True)
+        else:
+            # Ленты тех, кто уже ни на кого не подписан, просто удаляются
+            TimelineEntry.objects.exclude(
+                user__in=Follow.objects.values("user")
+            ).delete()
+            user_ids = Follow.objects.values_list(
+                "user", flat=True
+            ).distinct()
+
+        rebuilt = 0
+        for user_id in user_ids.iterator():
+            rebuild_timeline(user_id)
+            rebuilt += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересобрано лент: {rebuilt}")
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_comment_counts
+from posts.counters import reconcile_profiles
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики постов, комментариев и подписок"
+
+    def handle(self, *args, **options):
+        profiles = reconcile_profiles()
+        posts = reconcile_comment_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f"Исправлено профилей: {profiles}, постов: {posts}"
+        ))
@@ -0,0 +1,154 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts.bulk import bulk_create_with_ids
+from posts.bulk import explicit_dates
+from posts.bulk import refresh_denormalized
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+
+# За сколько дней назад разбрасываются даты постов и комментариев
+DATE_SPAN = timedelta(days=365)
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу тестовыми пользователями, группами, постами, "
+        "комментариями и подписками для нагрузочных замеров"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=50)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--comments", type=int, default=20000)
+        parser.add_argument("--follows", type=int, default=5000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Зерно генератора: одинаковое зерно даёт одинаковые данные"
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1:
+            raise CommandError("Нужен хотя бы один пользователь")
+        self.batch_size = options["batch_size"]
+        self.random = random.Random(options["seed"])
+        self.fake = Faker("ru_RU")
+        self.fake.seed_instance(options["seed"])
+        self.now = timezone.now()
+
+        users = self.create(
+            User, options["users"], self.build_user
+        )
+        groups = self.create(
+            Group, options["groups"], self.build_group
+        )
+        with explicit_dates(Post, "pub_date", "updated"):
+            posts = self.create(
+                Post,
+                options["posts"],
+                lambda number: self.build_post(users, groups)
+            )
+        with explicit_dates(Comment, "created"):
+            self.create(
+                Comment,
+                options["comments"] if posts else 0,
+                lambda number: self.build_comment(users, posts)
+            )
+        self.create_follows(users, options["follows"])
+
+        self.stdout.write("Пересчёт счётчиков, лент и индекса поиска")
+        refresh_denormalized()
+        self.stdout.write(self.style.SUCCESS("Готово"))
+
+    def create(self, model, total, build):
+        """Создаёт total объектов пачками и возвращает список их id."""
+        ids = []
+        for start in range(0, total, self.batch_size):
+            objects = [
+                build(number)
+                for number in range(start, min(start + self.batch_size, total))
+            ]
+            with transaction.atomic():
+                bulk_create_with_ids(model, objects)
+            ids.extend(obj.pk for obj in objects)
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}: "
+                f"{min(start + self.batch_size, total)}/{total}"
+            )
+        return ids
+
+    def random_date(self):
+        return self.now - timedelta(
+            seconds=self.random.randint(0, int(DATE_SPAN.total_seconds()))
+        )
+
+    def build_user(self, number):
+        return User(
+            username=f"{self.fake.user_name()}_{number}",
+            first_name=self.fake.first_name(),
+            last_name=self.fake.last_name(),
+            password=make_password(None),
+        )
+
+    def build_group(self, number):
+        return Group(
+            title=self.fake.sentence(nb_words=3)[:200],
+            slug=f"group-{number}-{self.random.randrange(10 ** 6)}",
+            description=self.fake.paragraph(),
+        )
+
+    def build_post(self, users, groups):
+        pub_date = self.random_date()
+        group_id = None
+        if groups and self.random.random() < 0.5:
+            group_id = self.random.choice(groups)
+        return Post(
+            text=self.fake.text(max_nb_chars=300),
+            author_id=self.random.choice(users),
+            group_id=group_id,
+            pub_date=pub_date,
+            updated=pub_date,
+        )
+
+    def build_comment(self, users, posts):
+        return Comment(
+            text=self.fake.sentence(),
+            author_id=self.random.choice(users),
+            post_id=self.random.choice(posts),
+            created=self.random_date(),
+        )
+
+    def create_follows(self, users, total):
+        if len(users) < 2:
+            return
+        pairs = set()
+        # Пары ограничены числом возможных подписок
+        total = min(total, len(users) * (len(users) - 1))
+        while len(pairs) < total:
+            user_id, author_id = self.random.sample(users, 2)
+            pairs.add((user_id, author_id))
+        pairs = sorted(pairs)
+        for start in range(0, total, self.batch_size):
+            Follow.objects.bulk_create(
+                [
+                    Follow(user_id=user_id, author_id=author_id)
+                    for user_id, author_id
+                    in pairs[start:start + self.batch_size]
+                ],
+                ignore_conflicts=True
+            )
+        self.stdout.write(f"подписки: {total}/{total}")
@@ -0,0 +1,73 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Profile = apps.get_model('posts', 'Profile')
+
+    Post.objects.update(comment_count=count_subquery(Comment, 'post'))
+    users = User.objects.annotate(
+        actual_post_count=count_subquery(Post, 'author'),
+        actual_follower_count=count_subquery(Follow, 'author'),
+        actual_following_count=count_subquery(Follow, 'user'),
+    )
+    profiles = []
+    for user in users.iterator():
+        profiles.append(Profile(
+            user_id=user.pk,
+            post_count=user.actual_post_count,
+            follower_count=user.actual_follower_count,
+            following_count=user.actual_following_count,
+        ))
+        if len(profiles) >= 500:
+            Profile.objects.bulk_create(profiles)
+            profiles = []
+    Profile.objects.bulk_create(profiles)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_auto_20261018_0333'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Число постов')),
+                ('follower_count', models.PositiveIntegerField(default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Число подписок')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль',
+                'verbose_name_plural': 'Профили',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
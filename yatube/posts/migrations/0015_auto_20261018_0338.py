@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='card_thumbnail',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Миниатюра для ленты'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='detail_thumbnail',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Миниатюра для страницы поста'),
+        ),
+    ]
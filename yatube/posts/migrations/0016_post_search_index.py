@@ -0,0 +1,35 @@
+from django.db import migrations
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_search_index(apps, schema_editor):
+    # Полнотекстовый индекс FTS5 есть только у SQLite, остальные
+    # базы ищут через LikeSearchBackend
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+        f'text, tokenize="unicode61 remove_diacritics 2")'
+    )
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, text) '
+        f'SELECT id, text FROM posts_post'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_auto_20261018_0338'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
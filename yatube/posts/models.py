@@ -21,6 +21,35 @@ class Group(models.Model):
         return self.title
 
 
+class Profile(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы считать COUNT."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="profile",
+        verbose_name="Пользователь"
+    )
+    post_count = models.PositiveIntegerField(
+        verbose_name="Число постов",
+        default=0
+    )
+    follower_count = models.PositiveIntegerField(
+        verbose_name="Число подписчиков",
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name="Число подписок",
+        default=0
+    )
+
+    class Meta:
+        verbose_name = "Профиль"
+        verbose_name_plural = "Профили"
+
+    def __str__(self):
+        return str(self.user)
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name="Текст поста",
@@ -30,6 +59,10 @@ class Post(models.Model):
         verbose_name="Дата публикации",
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -51,9 +84,43 @@ class Post(models.Model):
         blank=True,
         help_text="Загрузите изображение"
     )
+    # URL миниатюр готовит очередь задач, шаблоны их только выводят
+    card_thumbnail = models.CharField(
+        verbose_name="Миниатюра для ленты",
+        max_length=255,
+        blank=True,
+        editable=False
+    )
+    detail_thumbnail = models.CharField(
+        verbose_name="Миниатюра для страницы поста",
+        max_length=255,
+        blank=True,
+        editable=False
+    )
+    comment_count = models.PositiveIntegerField(
+        verbose_name="Число комментариев",
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ("-pub_date",)
+        # Индексы под фильтр и сортировку каждой ленты: id замыкает
+        # ключ сортировки (pub_date, id), индекс читается в обе стороны
+        indexes = [
+            models.Index(
+                fields=["pub_date", "id"],
+                name="post_pub_date_idx"
+            ),
+            models.Index(
+                fields=["author", "pub_date", "id"],
+                name="post_author_pub_date_idx"
+            ),
+            models.Index(
+                fields=["group", "pub_date", "id"],
+                name="post_group_pub_date_idx"
+            ),
+        ]
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
 
@@ -85,6 +152,12 @@ class Comment(models.Model):
     )
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "created", "id"],
+                name="comment_post_created_idx"
+            ),
+        ]
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
 
@@ -117,3 +190,39 @@ class Follow(models.Model):
                 name="cant_follow_yourself"
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Читатель"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пост"
+    )
+    # Копия Post.pub_date: лента читается по индексу без JOIN
+    pub_date = models.DateTimeField(
+        verbose_name="Дата публикации поста"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"],
+                name="unique_timeline_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "pub_date", "id"],
+                name="timeline_user_pub_date_idx"
+            ),
+        ]
+        verbose_name = "Запись ленты подписок"
+        verbose_name_plural = "Записи ленты подписок"
@@ -0,0 +1,179 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from core.tasks import PRIORITY_HIGH
+from core.tasks import task
+from posts.models import Post
+from posts.utils import FEED_ORDERING
+from posts.utils import feed_queryset
+
+FTS_TABLE = "posts_post_fts"
+BATCH_SIZE = 500
+WORD_RE = re.compile(r"\w+")
+
+
+def get_search_backend():
+    """Возвращает бэкенд поиска из settings.SEARCH_BACKEND."""
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+def query_words(query):
+    """Слова запроса без операторов и знаков препинания."""
+    return WORD_RE.findall(query or "")
+
+
+class SearchResults:
+    """Ленивый результат поиска для Paginator.
+
+    Число совпадений и страница считаются отдельными запросами,
+    а посты страницы подтягиваются так же, как в ленте.
+    """
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        ids = self.backend.search(self.query, start, stop - start)
+        posts = feed_queryset(Post.objects.all()).in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+class LikeSearchBackend:
+    """Поиск подстрок через LIKE для баз без полнотекстового индекса.
+
+    Результаты идут от новых постов к старым.
+    """
+
+    def filter(self, queryset, query):
+        words = query_words(query)
+        if not words:
+            return queryset.none()
+        condition = Q()
+        for word in words:
+            condition &= Q(text__icontains=word)
+        return queryset.filter(condition)
+
+    def search(self, query, offset, limit):
+        return list(self.filter(
+            Post.objects.order_by(*FEED_ORDERING), query
+        ).values_list("id", flat=True)[offset:offset + limit])
+
+    def count(self, query):
+        return self.filter(Post.objects.all(), query).count()
+
+    def index(self, posts):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SqliteSearchBackend(LikeSearchBackend):
+    """Инвертированный индекс SQLite FTS5.
+
+    Текст постов лежит в виртуальной таблице posts_post_fts
+    с rowid, равным id поста. Совпадения ранжируются по bm25,
+    каждое слово запроса ищется как префикс.
+    """
+
+    def match(self, query):
+        return " ".join(f'"{word}"*' for word in query_words(query))
+
+    def filter(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.none()
+        return queryset.extra(
+            where=[
+                f"{Post._meta.db_table}.id IN "
+                f"(SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)"
+            ],
+            params=[match]
+        )
+
+    def search(self, query, offset, limit):
+        match = self.match(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}), rowid DESC LIMIT %s OFFSET %s",
+                [match, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def count(self, query):
+        match = self.match(query)
+        if not match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [match]
+            )
+            return cursor.fetchone()[0]
+
+    def index(self, posts):
+        rows = [(post.pk, post.text) for post in posts]
+        self.remove([post_id for post_id, _ in rows])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)", rows
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(post_id,) for post_id in post_ids]
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        indexed = 0
+        batch = []
+        posts = Post.objects.only("id", "text")
+        for post in posts.iterator(chunk_size=BATCH_SIZE):
+            batch.append(post)
+            if len(batch) >= BATCH_SIZE:
+                self.index(batch)
+                indexed += len(batch)
+                batch = []
+        self.index(batch)
+        return indexed + len(batch)
+
+
+@task(priority=PRIORITY_HIGH)
+def index_posts(post_ids):
+    """Индексирует текущий текст постов; удалённые пропускаются."""
+    get_search_backend().index(
+        Post.objects.filter(pk__in=post_ids).only("id", "text")
+    )
+
+
+@task(priority=PRIORITY_HIGH)
+def remove_posts(post_ids):
+    get_search_backend().remove(post_ids)
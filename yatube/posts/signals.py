@@ -0,0 +1,150 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from posts.cache import bump_feed_versions
+from posts.cache import group_scope
+from posts.cache import index_scope
+from posts.cache import post_scope
+from posts.cache import profile_scope
+from posts.counters import change_comment_count
+from posts.counters import change_profile_counters
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import Profile
+from posts.models import User
+from posts.search import index_posts
+from posts.search import remove_posts
+from posts.stream import publish_post
+from posts.timeline import backfill_author
+from posts.timeline import schedule_fan_out
+from posts.timeline import remove_author
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_group(sender, instance, **kwargs):
+    """Запоминает группу поста до редактирования.
+
+    Если пост перенесли в другую группу, сбросить нужно
+    и страницы прежней группы.
+    """
+    instance._previous_group_slug = None
+    if instance.pk is not None:
+        instance._previous_group_slug = Post.objects.filter(
+            pk=instance.pk
+        ).values_list("group__slug", flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    scopes = [
+        index_scope(),
+        profile_scope(instance.author.username),
+        post_scope(instance.pk),
+    ]
+    if instance.group_id is not None:
+        scopes.append(group_scope(instance.group.slug))
+    previous_group = getattr(instance, "_previous_group_slug", None)
+    if previous_group is not None:
+        scopes.append(group_scope(previous_group))
+    bump_feed_versions(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    bump_feed_versions(post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    bump_feed_versions(group_scope(instance.slug))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    # Кнопка подписки на странице автора зависит от подписок
+    bump_feed_versions(profile_scope(instance.author.username))
+
+
+@receiver(post_save, sender=Post)
+def add_post_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        schedule_fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def stream_new_post(sender, instance, created, **kwargs):
+    # Подписчики потоков получают пост, только когда он закоммичен
+    if created:
+        transaction.on_commit(lambda: publish_post(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def add_author_to_timeline(sender, instance, created, **kwargs):
+    if created:
+        backfill_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_author_from_timeline(sender, instance, **kwargs):
+    remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, **kwargs):
+    if created:
+        change_profile_counters(instance.author_id, post_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_profile_counters(instance.author_id, post_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_created_comment(sender, instance, created, **kwargs):
+    if created:
+        change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_created_follow(sender, instance, created, **kwargs):
+    if created:
+        change_profile_counters(instance.user_id, following_count=1)
+        change_profile_counters(instance.author_id, follower_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_profile_counters(instance.user_id, following_count=-1)
+    change_profile_counters(instance.author_id, follower_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields, **kwargs):
+    if update_fields is None or "text" in update_fields:
+        index_posts.delay([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    remove_posts.delay([instance.pk])
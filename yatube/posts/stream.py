@@ -0,0 +1,78 @@
+import json
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import render_to_string
+
+from core.events import get_broker
+from posts.models import Post
+from posts.utils import feed_queryset
+
+
+def index_channel():
+    return "index"
+
+
+def group_channel(group_id):
+    return f"group:{group_id}"
+
+
+def author_channel(author_id):
+    return f"author:{author_id}"
+
+
+def publish_post(post_id):
+    """Публикует новый пост в каналы главной, группы и автора.
+
+    Карточка рендерится один раз здесь, а не в каждом потоке
+    подписчиков.
+    """
+    post = feed_queryset(Post.objects.filter(pk=post_id)).first()
+    if post is None:
+        return
+    data = dict(
+        id=post.pk,
+        html=render_to_string("includes/cycle.html", {"post": post}),
+    )
+    broker = get_broker()
+    channels = [index_channel(), author_channel(post.author_id)]
+    if post.group_id is not None:
+        channels.append(group_channel(post.group_id))
+    for channel in channels:
+        broker.publish(channel, data)
+
+
+def event_stream(channels, last_event_id=None, cards=True):
+    """Поток server-sent events о новых постах каналов.
+
+    Пока событий нет, раз в settings.SSE_HEARTBEAT секунд уходит
+    комментарий, чтобы прокси не закрыли соединение. Через
+    settings.SSE_MAX_DURATION секунд поток завершается: браузер
+    переподключится сам и пришлёт Last-Event-ID.
+    """
+    # Соединение с базой не нужно всё время, пока открыт поток
+    connections.close_all()
+    broker = get_broker()
+    channels = set(channels)
+    position = last_event_id
+    now = time.monotonic()
+    deadline = now + settings.SSE_MAX_DURATION
+    heartbeat = now + settings.SSE_HEARTBEAT
+    yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+    while now < deadline:
+        position, events = broker.listen(
+            channels, position, min(heartbeat, deadline) - now
+        )
+        now = time.monotonic()
+        for event in events:
+            data = event.data if cards else dict(id=event.data["id"])
+            yield (
+                f"id: {event.id}\nevent: post\n"
+                f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+            )
+        if events:
+            heartbeat = now + settings.SSE_HEARTBEAT
+        elif now >= heartbeat:
+            yield ": heartbeat\n\n"
+            heartbeat = now + settings.SSE_HEARTBEAT
@@ -0,0 +1,234 @@
+import gzip
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+from posts.tests.consts import ANOTHER_USERNAME
+from posts.tests.consts import DESCRIPTION
+from posts.tests.consts import SLUG
+from posts.tests.consts import TEXT
+from posts.tests.consts import TITLE
+from posts.tests.consts import USERNAME
+
+
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.group = Group.objects.create(
+            title=TITLE, slug=SLUG, description=DESCRIPTION
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f"{TEXT} {number}"
+            )
+            for number in range(15)
+        ]
+        cls.POSTS = reverse("api_v1:posts")
+
+    def setUp(self):
+        cache.clear()
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, url, **params):
+        """Все страницы ленты по курсорам next_cursor."""
+        ids = []
+        data = self.get_json(url, **params)
+        ids += [item["id"] for item in data["results"]]
+        while data["next_cursor"]:
+            data = self.get_json(url, cursor=data["next_cursor"], **params)
+            ids += [item["id"] for item in data["results"]]
+        return ids
+
+    def test_feeds_are_paginated_by_cursor(self):
+        """Ленты API отдают посты от новых к старым по курсору."""
+        expected = [post.id for post in reversed(self.posts)]
+        self.client.force_login(self.user)
+        for url in (
+            self.POSTS,
+            reverse("api_v1:group_posts", args=[SLUG]),
+            reverse("api_v1:profile_posts", args=[ANOTHER_USERNAME]),
+            reverse("api_v1:follow_posts"),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(url, limit=4), expected)
+
+    def test_fields_are_selected(self):
+        """Отдаются только запрошенные поля."""
+        data = self.get_json(self.POSTS, fields="id,author,group")
+        self.assertEqual(data["results"][0], dict(
+            id=self.posts[-1].id, author=ANOTHER_USERNAME, group=SLUG
+        ))
+
+        response = self.client.get(self.POSTS, {"fields": "id,password"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_is_one_query(self):
+        """Страница ленты читается одним запросом без объектов моделей."""
+        with self.assertNumQueries(1):
+            self.client.get(self.POSTS, {"fields": "id,text,author"})
+
+    def test_errors(self):
+        """Ошибки API отдаются в JSON."""
+        for url, status in (
+            (reverse("api_v1:group_posts", args=["missing"]), 404),
+            (reverse("api_v1:follow_posts"), 401),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn("error", response.json())
+
+    def test_response_is_compressed(self):
+        """Ответ сжимается gzip, если клиент его принимает."""
+        response = self.client.get(
+            self.POSTS, HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(len(data["results"]), 10)
+
+
+class BatchApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.post = Post.objects.create(author=cls.author, text=TEXT)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post_json(self, name, data):
+        return self.client.post(
+            reverse(f"api_v1:{name}"),
+            json.dumps(data),
+            content_type="application/json"
+        )
+
+    def test_comments_batch(self):
+        """Пакет комментариев пишется целиком, ошибки — по элементам."""
+        with self.assertNumQueries(8):
+            response = self.post_json("comments_batch", {"comments": [
+                {"post": self.post.id, "text": "Первый"},
+                {"post": 0, "text": "Пост не существует"},
+                {"post": self.post.id, "text": ""},
+                {"post": self.post.id, "text": "Второй"},
+            ]})
+
+        results = response.json()["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "error", "error", "created"]
+        )
+        comments = Comment.objects.filter(post=self.post).order_by("id")
+        self.assertEqual(
+            [(comment.id, comment.text) for comment in comments],
+            [(results[0]["id"], "Первый"), (results[3]["id"], "Второй")]
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+    def test_comment_ids_are_not_reused(self):
+        """Пакет не получает id удалённого последнего комментария."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text=TEXT
+        )
+        deleted_id = comment.id
+        comment.delete()
+        response = self.post_json("comments_batch", {"comments": [
+            {"post": self.post.id, "text": "Первый"},
+            {"post": self.post.id, "text": "Второй"},
+        ]})
+        ids = [result["id"] for result in response.json()["results"]]
+        self.assertGreater(ids[0], deleted_id)
+        self.assertEqual(
+            ids,
+            list(Comment.objects.order_by("id").values_list("id", flat=True))
+        )
+
+    def test_follows_batch(self):
+        """Подписки пакетом обновляют счётчики и ленту подписок."""
+        response = self.post_json("follows_batch", {"follows": [
+            {"author": ANOTHER_USERNAME, "action": "follow"},
+            {"author": ANOTHER_USERNAME, "action": "follow"},
+            {"author": USERNAME, "action": "follow"},
+            {"author": "missing", "action": "follow"},
+        ]})
+        self.assertEqual(
+            [result["status"] for result in response.json()["results"]],
+            ["followed", "unchanged", "error", "error"]
+        )
+        self.assertTrue(
+            Follow.objects.filter(user=self.user, author=self.author).exists()
+        )
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.follower_count, 1)
+        self.assertEqual(
+            self.client.get(reverse("api_v1:follow_posts")).json()[
+                "results"
+            ][0]["id"],
+            self.post.id
+        )
+
+        response = self.post_json("follows_batch", {"follows": [
+            {"author": ANOTHER_USERNAME, "action": "unfollow"},
+        ]})
+        self.assertEqual(response.json()["results"][0]["status"], "unfollowed")
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.follower_count, 0)
+
+    def test_batch_item_types_are_checked(self):
+        """Поле неверного типа — ошибка элемента, а не всего запроса."""
+        response = self.post_json("comments_batch", {"comments": [
+            {"post": [self.post.id], "text": TEXT},
+            {"post": True, "text": TEXT},
+            {"post": str(self.post.id), "text": TEXT},
+            {"post": self.post.id, "text": [TEXT]},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result["status"] for result in response.json()["results"]],
+            ["error"] * 4
+        )
+        self.assertFalse(Comment.objects.exists())
+
+        response = self.post_json("follows_batch", {"follows": [
+            {"author": [ANOTHER_USERNAME], "action": "follow"},
+            {"author": ANOTHER_USERNAME, "action": ["follow"]},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result["status"] for result in response.json()["results"]],
+            ["error"] * 2
+        )
+        self.assertFalse(Follow.objects.exists())
+
+    def test_batch_limits(self):
+        """Слишком большой или некорректный пакет отклоняется."""
+        for data in (
+            {"comments": [{"post": self.post.id, "text": TEXT}] * 101},
+            {"comments": "не список"},
+            {},
+        ):
+            with self.subTest(data=str(data)[:30]):
+                response = self.post_json("comments_batch", data)
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Comment.objects.exists())
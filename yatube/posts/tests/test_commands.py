@@ -0,0 +1,382 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.test import TestCase
+from django.test import override_settings
+from PIL import Image
+
+from core.models import Task
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import Profile
+from posts.models import TimelineEntry
+from posts.models import User
+from posts.search import get_search_backend
+from posts.tests.consts import ANOTHER_USERNAME
+from posts.tests.consts import DESCRIPTION
+from posts.tests.consts import SLUG
+from posts.tests.consts import TEXT
+from posts.tests.consts import TITLE
+from posts.tests.consts import USERNAME
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class ExplainFeedsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.follower = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.group = Group.objects.create(
+            title=TITLE,
+            slug=SLUG,
+            description=DESCRIPTION
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text=TEXT,
+            group=cls.group
+        )
+        Comment.objects.create(post=cls.post, author=cls.user, text=TEXT)
+        Follow.objects.create(user=cls.follower, author=cls.user)
+
+    def test_explain_feeds_use_indexes(self):
+        """Запросы лент не сортируют выборку во временном B-дереве."""
+        out = StringIO()
+        call_command("explain_feeds", "--strict", stdout=out)
+        output = out.getvalue()
+
+        for feed in (
+            "index", "group_posts", "profile", "follow_index", "post_detail"
+        ):
+            with self.subTest(feed=feed):
+                self.assertIn(feed, output)
+        self.assertNotIn("TEMP B-TREE", output)
+
+
+class RebuildTimelinesCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.follower = User.objects.create_user(username=ANOTHER_USERNAME)
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        cls.post = Post.objects.create(author=cls.user, text=TEXT)
+
+    def test_rebuild_timelines(self):
+        """Команда восстанавливает ленту подписок из подписок."""
+        TimelineEntry.objects.all().delete()
+        TimelineEntry.objects.create(
+            user=self.user, post=self.post, pub_date=self.post.pub_date
+        )
+
+        call_command("rebuild_timelines", stdout=StringIO())
+
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list("user", "post")),
+            [(self.follower.id, self.post.id)]
+        )
+
+
+class ReconcileCountersCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.follower = User.objects.create_user(username=ANOTHER_USERNAME)
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        cls.post = Post.objects.create(author=cls.user, text=TEXT)
+        Comment.objects.create(post=cls.post, author=cls.user, text=TEXT)
+
+    def test_reconcile_counters(self):
+        """Команда исправляет разошедшиеся счётчики."""
+        Profile.objects.filter(user=self.user).update(
+            post_count=10, follower_count=10
+        )
+        Profile.objects.filter(user=self.follower).delete()
+        Post.objects.filter(pk=self.post.pk).update(comment_count=0)
+
+        call_command("reconcile_counters", stdout=StringIO())
+
+        self.assertEqual(
+            Profile.objects.get(user=self.user).post_count, 1
+        )
+        self.assertEqual(
+            Profile.objects.get(user=self.user).follower_count, 1
+        )
+        self.assertEqual(
+            Profile.objects.get(user=self.follower).following_count, 1
+        )
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comment_count, 1)
+
+
+class RebuildSearchIndexCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text=TEXT)
+
+    def test_rebuild_search_index(self):
+        """Команда индексирует посты, сохранённые мимо сигналов."""
+        backend = get_search_backend()
+        backend.remove([self.post.pk])
+        self.assertEqual(backend.count(TEXT), 0)
+
+        call_command("rebuild_search_index", stdout=StringIO())
+
+        self.assertEqual(backend.search(TEXT, 0, 10), [self.post.pk])
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_seed_links_created_rows(self):
+        """Посты и комментарии ссылаются только на созданные строки."""
+        # Удалённые последние строки сдвигают MAX(id) назад
+        author = User.objects.create_user(username=ANOTHER_USERNAME)
+        User.objects.create_user(username=USERNAME).delete()
+        Post.objects.bulk_create(
+            Post(author=author, text=TEXT) for _ in range(10)
+        )
+        Post.objects.all().delete()
+
+        call_command(
+            "seed_data", "--users", "3", "--groups", "0", "--posts", "10",
+            "--comments", "10", "--follows", "0", stdout=StringIO()
+        )
+
+        seeded = User.objects.exclude(username=ANOTHER_USERNAME)
+        self.assertEqual(
+            Post.objects.filter(author__in=seeded).count(), 10
+        )
+        self.assertEqual(Comment.objects.filter(
+            author__in=seeded, post__in=Post.objects.all()
+        ).count(), 10)
+
+    def test_seed_and_benchmark(self):
+        """Бенчмарк пишет результаты и падает на регрессии."""
+        call_command(
+            "seed_data", "--users", "5", "--groups", "2", "--posts", "30",
+            "--comments", "20", "--follows", "5", stdout=StringIO()
+        )
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(
+            sum(Profile.objects.values_list("post_count", flat=True)), 30
+        )
+        self.assertTrue(TimelineEntry.objects.exists())
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "benchmark.json")
+            call_command(
+                "benchmark_views", "--requests", "3", "--warmup", "0",
+                "--output", output, stdout=StringIO()
+            )
+            with open(output) as file:
+                results = json.load(file)
+            self.assertEqual(
+                set(results["views"]),
+                {
+                    "index", "group_posts", "profile",
+                    "post_detail", "follow_index", "api_index", "api_profile"
+                }
+            )
+
+            for stats in results["views"].values():
+                stats["queries_max"] = 0
+            with open(output, "w") as file:
+                json.dump(results, file)
+            with self.assertRaisesMessage(CommandError, "запросов"):
+                call_command(
+                    "benchmark_views", "--requests", "3",
+                    "--baseline", output, stdout=StringIO()
+                )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkConcurrencyCommandTest(TestCase):
+    def test_requires_database_file(self):
+        """Замер конкуренции не запускается на базе в памяти."""
+        with self.assertRaises(CommandError):
+            call_command("benchmark_concurrency", stdout=StringIO())
+
+
+class ImportPostsCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title=TITLE,
+            slug=SLUG,
+            description=DESCRIPTION
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as file:
+            file.write(content)
+        return path
+
+    def test_import_jsonl(self):
+        """Посты импортируются с датами, картинками и комментариями."""
+        Image.new("RGB", (2, 2)).save(os.path.join(self.directory, "a.png"))
+        records = [
+            dict(
+                text=TEXT, author=USERNAME, group=SLUG,
+                pub_date="2020-01-02T03:04:05+00:00", image="a.png",
+                comments=[dict(text="Комментарий", author=USERNAME)]
+            ),
+            dict(text=TEXT, author="unknown"),
+        ]
+        path = self.write(
+            "posts.jsonl", "\n".join(json.dumps(record) for record in records)
+        )
+
+        # TestCase не коммитит: задача миниатюр ставится сразу
+        with mock.patch(
+            "core.tasks.transaction.on_commit", lambda func: func()
+        ):
+            call_command(
+                "import_posts", path, "--images-dir", self.directory,
+                stdout=StringIO(), stderr=StringIO()
+            )
+
+        post = Post.objects.get()
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertTrue(post.image.name.startswith("posts/a"))
+        self.assertEqual(post.comments.get().text, "Комментарий")
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.user).post_count, 1)
+        self.assertEqual(get_search_backend().search(TEXT, 0, 10), [post.pk])
+        task = Task.objects.get()
+        self.assertEqual(task.name, "posts.thumbnails.generate_thumbnails")
+        self.assertEqual(json.loads(task.args), [post.pk])
+
+    def test_bad_records_are_skipped(self):
+        """Некорректные записи пропускаются, импорт продолжается."""
+        records = [
+            [1, 2],
+            dict(text=TEXT, author=USERNAME, pub_date="2020-13-45T00:00:00"),
+            dict(text=[TEXT], author=USERNAME),
+            dict(text=TEXT, author=USERNAME, comments="не список"),
+            dict(text="Хороший пост", author=USERNAME, comments=[
+                "не объект",
+                dict(text=TEXT, author=USERNAME, created="вчера"),
+                dict(text="Комментарий", author=USERNAME),
+            ]),
+        ]
+        path = self.write(
+            "posts.jsonl", "\n".join(json.dumps(record) for record in records)
+        )
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command("import_posts", path, stdout=stdout, stderr=stderr)
+
+        post = Post.objects.get()
+        self.assertEqual(post.text, "Хороший пост")
+        self.assertEqual(post.comments.get().text, "Комментарий")
+        self.assertIn("пропущено: 6", stdout.getvalue())
+        self.assertIn("некорректная дата", stderr.getvalue())
+
+        path = self.write(
+            "posts.csv", f"text,author,comments\n{TEXT},{USERNAME},abc\n"
+        )
+        call_command("import_posts", path, stdout=stdout, stderr=stderr)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exclude(post=post).exists())
+
+    def test_import_refreshes_only_touched_rows(self):
+        """После импорта пересчитывается только затронутое им."""
+        follower = User.objects.create_user(username=ANOTHER_USERNAME)
+        Follow.objects.create(user=follower, author=self.user)
+        other = Post.objects.create(author=follower, text=TEXT)
+        # Расхождения вне импорта остаются до reconcile_counters
+        Post.objects.filter(pk=other.pk).update(comment_count=5)
+        path = self.write("posts.jsonl", json.dumps(dict(
+            text="Новый пост", author=USERNAME, group=SLUG,
+            comments=[dict(text="Комментарий", author=ANOTHER_USERNAME)]
+        )))
+
+        call_command("import_posts", path, stdout=StringIO())
+
+        post = Post.objects.get(text="Новый пост")
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.user).post_count, 1)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=follower).values_list(
+                "post", flat=True
+            )),
+            [post.pk]
+        )
+        self.assertEqual(
+            get_search_backend().search("Новый", 0, 10), [post.pk]
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.comment_count, 5)
+
+    def test_import_csv_creates_authors(self):
+        """CSV импортируется пачками, неизвестные авторы создаются."""
+        path = self.write(
+            "posts.csv",
+            "text,author,group\n"
+            + "".join(f"Пост {number},new_author,\n" for number in range(5))
+        )
+
+        call_command(
+            "import_posts", path, "--batch-size", "2", "--create-authors",
+            stdout=StringIO()
+        )
+
+        self.assertEqual(
+            Post.objects.filter(author__username="new_author").count(), 5
+        )
+        self.assertEqual(
+            Profile.objects.get(user__username="new_author").post_count, 5
+        )
+
+
+class ExportDataCommandTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text=TEXT)
+
+    def test_export_round_trips_through_import(self):
+        """Выгрузка постов читается обратно командой import_posts."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "posts.jsonl")
+            call_command(
+                "export_data", "--data", "posts", "--output", path,
+                stderr=StringIO()
+            )
+            call_command("import_posts", path, stdout=StringIO())
+
+        first, second = Post.objects.order_by("id")
+        self.assertEqual(second.text, first.text)
+        self.assertEqual(second.pub_date, first.pub_date)
+
+    def test_export_to_stdout(self):
+        """Без --output выгрузка пишется в stdout команды."""
+        out = StringIO()
+        call_command("export_data", "--data", "posts", stdout=out)
+        record = json.loads(out.getvalue())
+        self.assertEqual(record["text"], TEXT)
@@ -1,15 +1,21 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
+
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client
+from django.test import RequestFactory
 from django.test import TestCase
 from django.test import override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.models import Comment
 from posts.models import Group
 from posts.models import Post
+from posts.models import Profile
 from posts.models import User
 from posts.tests.consts import ANOTHER_SLUG
 from posts.tests.consts import ANOTHER_USERNAME
@@ -18,6 +24,7 @@ from posts.tests.consts import SLUG
 from posts.tests.consts import TEXT
 from posts.tests.consts import TITLE
 from posts.tests.consts import USERNAME
+from posts.uploadhandlers import ImageUploadHandler
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -122,12 +129,86 @@ class PostFormTest(TestCase):
             Post.objects.count(),
             post_count + 1
         )
+        self.assertEqual(
+            Profile.objects.get(user=self.user).post_count,
+            Post.objects.filter(author=self.user).count()
+        )
 
         post = Post.objects.first()
         self.assertEqual(post.text, form_data["text"])
         self.assertEqual(post.group.id, form_data["group"])
         self.assertEqual(self.post.image, form_data["image"])
 
+    def test_create_post_rejects_large_images(self):
+        """Слишком большие изображения отклоняются при загрузке"""
+        post_count = Post.objects.count()
+        buffer = BytesIO()
+        Image.new("RGB", (20, 20)).save(buffer, format="PNG")
+        cases = {
+            "слишком большое": {"MAX_IMAGE_PIXELS": 100},
+            "больше допустимых": {"MAX_UPLOAD_SIZE": 10},
+        }
+        for message, limits in cases.items():
+            with self.subTest(message=message), override_settings(**limits):
+                response = self.authorized_author.post(
+                    self.POST_CREATE,
+                    data={
+                        "text": TEXT,
+                        "image": SimpleUploadedFile(
+                            "big.png", buffer.getvalue(), "image/png"
+                        ),
+                    },
+                )
+                self.assertEqual(response.status_code, 200)
+                errors = response.context["form"].errors["image"]
+                self.assertEqual(len(errors), 1)
+                self.assertIn(message, errors[0])
+                self.assertEqual(Post.objects.count(), post_count)
+
+    def test_image_handler_only_on_post_forms(self):
+        """Проверка изображений не распространяется на другие загрузки."""
+        request = RequestFactory().post("/")
+        self.assertFalse(any(
+            isinstance(handler, ImageUploadHandler)
+            for handler in request.upload_handlers
+        ))
+
+        # CSRF проверяется и после смены обработчиков загрузки
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        post_count = Post.objects.count()
+        response = client.post(self.POST_CREATE, data={"text": TEXT})
+        self.assertTemplateUsed(response, "core/403csrf.html")
+        self.assertEqual(Post.objects.count(), post_count)
+
+    def test_decompression_bomb_is_too_large(self):
+        """Изображение сверх предела Pillow — большое, а не чужой файл."""
+        buffer = BytesIO()
+        Image.new("RGB", (20, 20)).save(buffer, format="PNG")
+        # 400 пикселей: предупреждение Pillow при 200, ошибка при 100
+        for limit in (200, 100):
+            with self.subTest(limit=limit), mock.patch.object(
+                Image, "MAX_IMAGE_PIXELS", limit
+            ):
+                handler = ImageUploadHandler()
+                handler.new_file("image", "big.png", "image/png", None)
+                self.addCleanup(handler.file.close)
+                handler.receive_data_chunk(buffer.getvalue(), 0)
+                handler.file_complete(len(buffer.getvalue()))
+                self.assertEqual(
+                    handler.file.upload_error, "Изображение слишком большое"
+                )
+
+    @override_settings(MAX_UPLOAD_SIZE=512 * 1024)
+    def test_upload_limit_under_megabyte(self):
+        """Предел меньше мегабайта выводится в килобайтах."""
+        handler = ImageUploadHandler()
+        handler.new_file("image", "big.png", "image/png", None)
+        self.addCleanup(handler.file.close)
+        handler.receive_data_chunk(b"0" * (512 * 1024 + 1), 0)
+        self.assertIn("512", handler.file.upload_error)
+        self.assertIn("КБ", handler.file.upload_error)
+
     def test_edit_post(self):
         """Проверка валидации формы при редактировании поста"""
         post_count = Post.objects.count()
@@ -236,6 +317,11 @@ class PostFormTest(TestCase):
             Comment.objects.count(),
             comment_count + 1
         )
+        self.post.refresh_from_db()
+        self.assertEqual(
+            self.post.comment_count,
+            self.post.comments.count()
+        )
 
     def test_comment_add_guest(self):
         """Проверка создания комментария гостевым пользователем
@@ -1,24 +1,44 @@
+import json
 import shutil
 import tempfile
+from unittest import mock
 from django import forms
 from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
 from django.test import Client
+from django.test import RequestFactory
 from django.test import TestCase
 from django.test import override_settings
 from django.urls import reverse
-
+from django.utils import timezone
+
+from core.events import get_broker
+from core.models import Task
+from posts.cache import bump_feed_versions
+from posts.cache import cache_feed
+from posts.cache import index_scope
+from posts.models import Comment
 from posts.models import Follow
 from posts.models import Group
 from posts.models import Post
+from posts.models import TimelineEntry
 from posts.models import User
+from posts.stream import publish_post
+from posts.tests.consts import ANOTHER_SLUG
 from posts.tests.consts import ANOTHER_USERNAME
 from posts.tests.consts import DESCRIPTION
 from posts.tests.consts import SLUG
 from posts.tests.consts import TEXT
 from posts.tests.consts import TITLE
 from posts.tests.consts import USERNAME
+from posts.thumbnails import generate_thumbnails
+from posts.timeline import fan_out
+from posts.timeline import fan_out_post
+from posts.utils import COUNT_COMMENTS_PER_PAGE
 from posts.utils import COUNT_POST_PER_PAGE
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -244,23 +264,91 @@ class PostPagesTest(TestCase):
             self.url_address["index"]
         ).content
 
-        Post.objects.create(
-            text="текст поста поста",
-            author=self.user,
-            group=self.group
-        )
+        # Изменение в обход сигналов не сбрасывает кеш
+        Post.objects.filter(pk=self.post.pk).update(text="Новый текст")
         response_old = self.authorized_client.get(
             self.url_address["index"]
         ).content
         self.assertEqual(response_old, response)
 
-        cache.clear()
+        Post.objects.create(
+            text="текст поста поста",
+            author=self.user,
+            group=self.group
+        )
 
         response_new = self.authorized_client.get(
             self.url_address["index"]
         ).content
         self.assertNotEqual(response_old, response_new)
 
+    def test_cache_invalidates_only_affected_pages(self):
+        """Новый пост сбрасывает кеш только своих лент"""
+        another_group = Group.objects.create(
+            title=TITLE,
+            slug=ANOTHER_SLUG,
+            description=DESCRIPTION
+        )
+        another_group_url = reverse(
+            "posts:group_list", kwargs={"slug": another_group.slug}
+        )
+        group_page = self.guest_client.get(
+            self.url_address["group_list"]
+        ).content
+        another_group_page = self.guest_client.get(another_group_url).content
+        Group.objects.filter(pk=another_group.pk).update(
+            description="Новое описание группы"
+        )
+
+        Post.objects.create(
+            text="текст поста поста",
+            author=self.user,
+            group=self.group
+        )
+
+        self.assertNotEqual(
+            self.guest_client.get(self.url_address["group_list"]).content,
+            group_page
+        )
+        self.assertEqual(
+            self.guest_client.get(another_group_url).content,
+            another_group_page
+        )
+
+    def test_cache_post_card(self):
+        """Карточка поста берётся из кеша, пока пост не отредактирован"""
+        self.guest_client.get(self.url_address["index"])
+
+        # Обновление в обход модели не меняет дату изменения поста
+        Post.objects.filter(pk=self.post.pk).update(text="Тихая правка")
+        bump_feed_versions(index_scope())
+        response = self.guest_client.get(self.url_address["index"])
+        self.assertContains(response, self.post.text)
+        self.assertNotContains(response, "Тихая правка")
+
+        self.authorized_author.post(
+            self.url_address["edit_post"],
+            data={"text": "Отредактированный текст", "group": self.group.id}
+        )
+        response = self.guest_client.get(self.url_address["index"])
+        self.assertContains(response, "Отредактированный текст")
+
+    def test_thumbnails_are_pregenerated(self):
+        """Страницы выводят заранее построенные миниатюры"""
+        generate_thumbnails(self.post.pk)
+        self.post.refresh_from_db()
+
+        self.assertTrue(self.post.card_thumbnail)
+        self.assertTrue(self.post.detail_thumbnail)
+        self.assertContains(
+            self.guest_client.get(self.url_address["index"]),
+            self.post.card_thumbnail
+        )
+        self.assertContains(
+            self.guest_client.get(self.url_address["post_detail"]),
+            self.post.detail_thumbnail
+        )
+
     def test_authorized_user_follow(self):
         """Проверка, что авторизированный пользователь
          может подписываться на других пользователей
@@ -331,6 +419,8 @@ class PaginatorViewsTest(TestCase):
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        # Очистка кеша
+        cache.clear()
 
     def test_paginator_page(self):
         """Проверка страниц с пагинатором."""
@@ -352,3 +442,572 @@ class PaginatorViewsTest(TestCase):
 
                 self.assertEqual(len(
                     response_second_page.context["page_obj"]), 1)
+
+    def test_cursor_paginator_page(self):
+        """Проверка страниц с курсорной пагинацией."""
+        paginator_list = [
+            self.INDEX,
+            self.GROUP_LIST,
+            self.PROFILE
+        ]
+
+        for reverse_name in paginator_list:
+            with self.subTest(reverse_name=reverse_name):
+                first_page = self.authorized_client.get(
+                    reverse_name + "?cursor="
+                ).context["page_obj"]
+                self.assertEqual(len(first_page), COUNT_POST_PER_PAGE)
+                self.assertFalse(first_page.has_previous())
+                self.assertTrue(first_page.has_next())
+
+                second_page = self.authorized_client.get(
+                    reverse_name + "?cursor=" + first_page.next_cursor
+                ).context["page_obj"]
+                self.assertEqual(len(second_page), 1)
+                self.assertFalse(second_page.has_next())
+                self.assertNotIn(second_page[0], first_page)
+
+                previous_page = self.authorized_client.get(
+                    reverse_name + "?cursor=" + second_page.previous_cursor
+                ).context["page_obj"]
+                self.assertEqual(
+                    list(previous_page.object_list),
+                    list(first_page.object_list)
+                )
+                self.assertFalse(previous_page.has_previous())
+
+    def test_cursor_paginator_broken_cursor(self):
+        """Повреждённый курсор открывает первую страницу."""
+        response = self.authorized_client.get(
+            self.GROUP_LIST + "?cursor=not-a-cursor"
+        )
+        self.assertEqual(
+            len(response.context["page_obj"]), COUNT_POST_PER_PAGE
+        )
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.follower = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.posts = []
+        # У каждого поста свой автор и своя группа, чтобы N+1
+        # на author/group сразу отразился на числе запросов
+        for variable in range(COUNT_POST_PER_PAGE * 2):
+            author = User.objects.create_user(
+                username=f"{USERNAME}{variable}",
+                first_name="Имя",
+                last_name="Фамилия"
+            )
+            group = Group.objects.create(
+                title=TITLE,
+                slug=f"{SLUG}-{variable}",
+                description=DESCRIPTION
+            )
+            cls.posts.append(
+                Post.objects.create(text=TEXT, author=author, group=group)
+            )
+            Follow.objects.create(user=cls.follower, author=author)
+        cls.author = author
+        cls.group = group
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        """Число запросов на страницу ленты не зависит от её размера."""
+        # Запросы на сессию и пользователя у авторизованного клиента
+        # добавляют ещё два к выборке страницы и COUNT(*)
+        feeds = (
+            (self.guest_client, reverse("posts:index"), 2),
+            (self.guest_client, reverse(
+                "posts:group_list", kwargs={"slug": self.group.slug}
+            ), 3),
+            (self.guest_client, reverse(
+                "posts:profile", kwargs={"username": self.author.username}
+            ), 3),
+            # Лента подписок: записи ленты и затем посты по их id
+            (self.follower_client, reverse("posts:follow_index"), 5),
+        )
+        for client, url, queries in feeds:
+            for page_size in (1, COUNT_POST_PER_PAGE, len(self.posts)):
+                with self.subTest(url=url, page_size=page_size):
+                    cache.clear()
+                    with mock.patch(
+                        "posts.utils.COUNT_POST_PER_PAGE", page_size
+                    ), self.assertNumQueries(queries):
+                        client.get(url)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.follower = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.FOLLOW_INDEX = reverse("posts:follow_index")
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def follow_feed(self):
+        return list(
+            self.follower_client.get(self.FOLLOW_INDEX).context["page_obj"]
+        )
+
+    def test_timeline_follow_and_unfollow(self):
+        """Подписка добавляет в ленту прежние посты, отписка убирает."""
+        old_post = Post.objects.create(author=self.author, text=TEXT)
+
+        self.follower_client.get(reverse(
+            "posts:profile_follow", kwargs={"username": self.author}
+        ))
+        new_post = Post.objects.create(author=self.author, text=TEXT)
+        self.assertEqual(self.follow_feed(), [new_post, old_post])
+
+        self.follower_client.get(reverse(
+            "posts:profile_unfollow", kwargs={"username": self.author}
+        ))
+        self.assertEqual(self.follow_feed(), [])
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих профилей."""
+        self.follower_client.get(reverse(
+            "posts:profile_follow", kwargs={"username": self.author}
+        ))
+        self.author.profile.refresh_from_db()
+        self.follower.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.follower_count, 1)
+        self.assertEqual(self.follower.profile.following_count, 1)
+
+        self.follower_client.get(reverse(
+            "posts:profile_unfollow", kwargs={"username": self.author}
+        ))
+        self.author.profile.refresh_from_db()
+        self.follower.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.follower_count, 0)
+        self.assertEqual(self.follower.profile.following_count, 0)
+
+    @mock.patch("posts.timeline.BATCH_SIZE", 1)
+    @mock.patch("core.tasks.transaction.on_commit", lambda func: func())
+    def test_large_fan_out_is_queued(self):
+        """Рассылку автору больше чем с пачкой подписчиков ведёт задача."""
+        for user in (self.follower, User.objects.create_user("second")):
+            Follow.objects.create(user=user, author=self.author)
+        post = Post.objects.create(author=self.author, text=TEXT)
+
+        self.assertFalse(TimelineEntry.objects.exists())
+        task = Task.objects.get(name="posts.timeline.fan_out")
+        self.assertEqual(json.loads(task.args), [post.pk])
+
+        fan_out(post.pk)
+        self.assertEqual(self.follow_feed(), [post])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_trimmed(self):
+        """Лента подписок хранит не больше TIMELINE_LENGTH постов."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=TEXT)
+            for _ in range(3)
+        ]
+
+        self.assertEqual(self.follow_feed(), posts[:0:-1])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_fan_out_queries_do_not_grow_with_followers(self):
+        """Рассылка поста и обрезка лент — пачкой, а не по подписчику."""
+        followers = [self.follower] + [
+            User.objects.create_user(username=f"follower{number}")
+            for number in range(4)
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=user, author=self.author) for user in followers
+        )
+        posts = [
+            Post.objects.create(author=self.author, text=TEXT)
+            for _ in range(3)
+        ]
+        # Подписчики, пачка INSERT и DELETE обрезки
+        with self.assertNumQueries(3):
+            fan_out_post(posts[-1])
+
+        for user in followers:
+            self.assertEqual(
+                list(TimelineEntry.objects.filter(user=user).order_by(
+                    "-pub_date", "-id"
+                ).values_list("post", flat=True)),
+                [posts[2].id, posts[1].id]
+            )
+
+
+@override_settings(TASKS_EAGER=True)
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # TestCase не коммитит: задачи индекса выполняются сразу
+        patcher = mock.patch(
+            "core.tasks.transaction.on_commit", lambda func: func()
+        )
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.rare = Post.objects.create(
+            author=cls.user, text="Котики спят, а собаки гуляют"
+        )
+        cls.frequent = Post.objects.create(
+            author=cls.user, text="Котики котики котики"
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text="Просто запись без совпадений"
+        )
+        cls.SEARCH = reverse("posts:search")
+
+    def search(self, query, **params):
+        response = self.client.get(self.SEARCH, {"q": query, **params})
+        return list(response.context["page_obj"])
+
+    def test_search_ranks_results(self):
+        """Поиск находит посты по префиксу слова и ранжирует их."""
+        self.assertEqual(self.search("котик"), [self.frequent, self.rare])
+        self.assertEqual(self.search("котики собаки"), [self.rare])
+        self.assertEqual(self.search('" OR *'), [])
+
+    def test_search_index_follows_changes(self):
+        """Изменение и удаление поста сразу видны в поиске."""
+        other = Post.objects.get(pk=self.other.pk)
+        other.text = "Теперь и здесь собаки"
+        other.save()
+        self.assertEqual(self.search("собаки"), [other, self.rare])
+
+        Post.objects.get(pk=self.rare.pk).delete()
+        self.assertEqual(self.search("собаки"), [other])
+
+    @override_settings(SEARCH_BACKEND="posts.search.LikeSearchBackend")
+    def test_like_search_backend(self):
+        """Запасной бэкенд ищет подстроки от новых постов к старым."""
+        self.assertEqual(self.search("отики"), [self.frequent, self.rare])
+
+    @mock.patch("posts.views.COUNT_POST_PER_PAGE", 1)
+    def test_search_pages_keep_query(self):
+        """Ссылки пагинатора сохраняют поисковый запрос."""
+        response = self.client.get(self.SEARCH, {"q": "котик"})
+        self.assertContains(response, "?q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA")
+        self.assertContains(response, "page=2")
+        self.assertEqual(self.search("котик", page=2), [self.rare])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по тому же индексу."""
+        admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin"
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "собак"}
+        )
+        self.assertEqual(
+            list(response.context["cl"].result_list), [self.rare]
+        )
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text=TEXT)
+        # Одинаковое время создания: порядок задаёт id
+        created = timezone.now()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=TEXT, created=created)
+            for _ in range(COUNT_COMMENTS_PER_PAGE + 5)
+        )
+        cls.comment_ids = list(
+            cls.post.comments.order_by("id").values_list("id", flat=True)
+        )
+        cls.POST_DETAIL = reverse(
+            "posts:post_detail", kwargs={"post_id": cls.post.id}
+        )
+        cls.POST_COMMENTS = reverse(
+            "posts:post_comments", kwargs={"post_id": cls.post.id}
+        )
+
+    def test_comments_are_paginated(self):
+        """Комментарии выводятся страницами и подгружаются по курсору."""
+        comments = self.client.get(self.POST_DETAIL).context["comments"]
+        self.assertEqual(
+            [comment.id for comment in comments],
+            self.comment_ids[:COUNT_COMMENTS_PER_PAGE]
+        )
+
+        data = self.client.get(
+            self.POST_COMMENTS, {"cursor": comments.next_cursor}
+        ).json()
+        self.assertEqual(
+            [comment["id"] for comment in data["comments"]],
+            self.comment_ids[COUNT_COMMENTS_PER_PAGE:]
+        )
+        self.assertIsNone(data["next_cursor"])
+        self.assertEqual(data["html"].count("media-body"), 5)
+
+    def test_comment_queries_do_not_depend_on_page_size(self):
+        """Авторы комментариев подтягиваются одним запросом."""
+        # Области ETag, пост с автором и профилем, страница комментариев
+        with self.assertNumQueries(3):
+            self.client.get(self.POST_DETAIL)
+        # Пост и страница комментариев
+        with self.assertNumQueries(2):
+            self.client.get(self.POST_COMMENTS)
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.another_user = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text=TEXT)
+        Post.objects.create(author=cls.another_user, text=TEXT)
+        Comment.objects.create(post=cls.post, author=cls.user, text=TEXT)
+        Follow.objects.create(user=cls.user, author=cls.another_user)
+        cls.EXPORT = reverse("posts:export_data")
+
+    def export(self, user, **params):
+        client = Client()
+        client.force_login(user)
+        response = client.get(self.EXPORT, params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_user_exports_own_content(self):
+        """Пользователь выгружает только своё содержимое."""
+        rows = [
+            json.loads(line)
+            for line in self.export(self.user).splitlines()
+        ]
+        self.assertEqual(
+            [(row["type"], row.get("author")) for row in rows],
+            [
+                ("posts", USERNAME),
+                ("comments", USERNAME),
+                ("follows", ANOTHER_USERNAME),
+            ]
+        )
+        self.assertEqual(rows[0]["id"], self.post.id)
+
+    def test_staff_exports_everything_as_csv(self):
+        """Staff выгружает все посты, CSV начинается с заголовка."""
+        staff = User.objects.create_user(username="staff", is_staff=True)
+        lines = self.export(staff, format="csv", data="posts").splitlines()
+        self.assertEqual(
+            lines[0], "type,id,text,pub_date,updated,author,group,image"
+        )
+        self.assertEqual(len(lines), 3)
+
+    def test_export_requires_login(self):
+        """Анонимный пользователь не может выгружать данные."""
+        response = self.client.get(self.EXPORT)
+        self.assertEqual(response.status_code, 302)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.another_user = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text=TEXT)
+        cls.INDEX = reverse("posts:index")
+        cls.POST_DETAIL = reverse(
+            "posts:post_detail", kwargs={"post_id": cls.post.id}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified_until_content_changes(self):
+        """Страницы отвечают 304, пока их содержимое не изменилось."""
+        for url in (self.INDEX, self.POST_DETAIL):
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+                Comment.objects.create(
+                    post=self.post, author=self.user, text=TEXT
+                )
+                Post.objects.create(author=self.user, text=TEXT)
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_since_for_anonymous(self):
+        """Аноним получает 304 по If-Modified-Since."""
+        last_modified = self.client.get(self.INDEX)["Last-Modified"]
+        response = self.client.get(
+            self.INDEX, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class EdgeCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.post = Post.objects.create(author=cls.author, text=TEXT)
+        cls.FRAGMENTS = reverse("posts:page_fragments")
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_shells_are_shared(self):
+        """Оболочки страниц не зависят от пользователя и кешируются."""
+        for url in (
+            reverse("posts:index"),
+            reverse("posts:profile", kwargs={"username": self.author}),
+            reverse("posts:post_detail", kwargs={"post_id": self.post.id}),
+        ):
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertNotContains(response, USERNAME)
+                self.assertNotIn("Cookie", response.get("Vary", ""))
+                self.assertIn("public", response["Cache-Control"])
+                self.assertIn("s-maxage", response["Cache-Control"])
+
+    def test_personal_page_is_not_shared(self):
+        """Страница, зависящая от сессии, кешируется по cookie."""
+        @cache_feed(index_scope)
+        def personal(request):
+            return HttpResponse(request.user.username)
+
+        def get(client):
+            factory = RequestFactory()
+            factory.cookies = client.cookies
+            request = factory.get("/personal/")
+            SessionMiddleware().process_request(request)
+            AuthenticationMiddleware().process_request(request)
+            return personal(request)
+
+        response = get(self.authorized_client)
+        self.assertContains(response, USERNAME)
+        self.assertIn("Cookie", response["Vary"])
+        self.assertNotContains(get(self.client), USERNAME)
+
+    def test_sticky_client_gets_private_pages(self):
+        """Клиент, недавно писавший в базу, не получает общую копию."""
+        self.client.cookies[settings.REPLICA_STICKY_COOKIE] = "1"
+        response = self.client.get(reverse("posts:index"))
+        self.assertNotIn("public", response["Cache-Control"])
+        self.assertNotIn("s-maxage", response["Cache-Control"])
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+
+    def test_fragments_are_personal(self):
+        """Фрагменты содержат меню, подписку и форму комментария."""
+        response = self.authorized_client.get(self.FRAGMENTS, {
+            "view": "posts:index",
+            "profile": ANOTHER_USERNAME,
+            "post": self.post.id,
+        })
+        fragments = response.json()
+
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn(USERNAME, fragments["user_menu"])
+        self.assertIn("Избранные авторы", fragments["switcher"])
+        self.assertIn("Подписаться", fragments["follow"])
+        self.assertIn("csrfmiddlewaretoken", fragments["comment_form"])
+
+        Follow.objects.create(user=self.user, author=self.author)
+        fragments = self.authorized_client.get(
+            self.FRAGMENTS, {"profile": ANOTHER_USERNAME}
+        ).json()
+        self.assertIn("Отписаться", fragments["follow"])
+
+    def test_anonymous_fragments(self):
+        """Аноним получает ссылки входа и не получает форму."""
+        fragments = self.client.get(
+            self.FRAGMENTS, {"post": self.post.id}
+        ).json()
+        self.assertIn("Войти", fragments["user_menu"])
+        self.assertNotIn("<form", fragments["comment_form"])
+
+
+@override_settings(SSE_HEARTBEAT=0.05, SSE_MAX_DURATION=0.2)
+class PostStreamTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.group = Group.objects.create(
+            title=TITLE, slug=SLUG, description=DESCRIPTION
+        )
+        cls.another_group = Group.objects.create(
+            title=TITLE, slug=ANOTHER_SLUG, description=DESCRIPTION
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        get_broker.cache_clear()
+        self.client.force_login(self.user)
+
+    def stream(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return b"".join(response.streaming_content).decode()
+
+    def test_new_post_is_streamed_to_feeds(self):
+        """Новый пост приходит в потоки главной, группы и подписок."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text=TEXT
+        )
+        publish_post(post.id)
+
+        for url in (
+            reverse("posts:index_stream"),
+            reverse("posts:group_stream", args=[SLUG]),
+            reverse("posts:follow_stream"),
+        ):
+            with self.subTest(url=url):
+                content = self.stream(url, HTTP_LAST_EVENT_ID="0")
+                self.assertIn("event: post", content)
+                self.assertIn(f'"id": {post.id}', content)
+                self.assertIn(TEXT, content)
+
+        content = self.stream(
+            reverse("posts:group_stream", args=[ANOTHER_SLUG]),
+            HTTP_LAST_EVENT_ID="0"
+        )
+        self.assertNotIn("event: post", content)
+
+    def test_stream_resumes_after_last_event(self):
+        """Поток досылает только события после Last-Event-ID."""
+        first, second = (
+            Post.objects.create(author=self.author, text=TEXT)
+            for _ in range(2)
+        )
+        publish_post(first.id)
+        last_id = get_broker().last_id
+        publish_post(second.id)
+
+        content = self.stream(
+            reverse("posts:index_stream") + "?cards=0",
+            HTTP_LAST_EVENT_ID=str(last_id)
+        )
+        self.assertIn(f'data: {{"id": {second.id}}}', content)
+        self.assertNotIn(f'"id": {first.id}', content)
+
+    def test_idle_stream_sends_heartbeats(self):
+        """Пока новых постов нет, поток шлёт пульс."""
+        content = self.stream(reverse("posts:index_stream"))
+        self.assertTrue(content.startswith("retry: "))
+        self.assertIn(": heartbeat", content)
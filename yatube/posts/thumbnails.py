@@ -0,0 +1,36 @@
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import task
+from posts.consts import THUMBNAIL_SIZES
+from posts.models import Post
+
+
+def reset_thumbnails(post):
+    """Сбрасывает миниатюры поста, у которого сменилось изображение.
+
+    Пока новые миниатюры не готовы, шаблоны показывают исходник.
+    """
+    for field in THUMBNAIL_SIZES:
+        setattr(post, field, "")
+
+
+def schedule_thumbnails(post):
+    """Ставит генерацию миниатюр в очередь задач после коммита."""
+    if post.image:
+        generate_thumbnails.delay(post.pk)
+
+
+@task()
+def generate_thumbnails(post_id):
+    """Генерирует миниатюры всех размеров и сохраняет их URL в пост."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    for field, geometry in THUMBNAIL_SIZES.items():
+        thumbnail = get_thumbnail(
+            post.image, geometry, crop="center", upscale=True
+        )
+        setattr(post, field, thumbnail.url)
+    # Изображение могли заменить, пока строились миниатюры
+    if Post.objects.filter(pk=post_id, image=post.image.name).exists():
+        post.save(update_fields=[*THUMBNAIL_SIZES, "updated"])
@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.db import connection
+
+from core.tasks import PRIORITY_HIGH
+from core.tasks import task
+from posts.models import Follow
+from posts.models import Post
+from posts.models import TimelineEntry
+from posts.utils import FEED_ORDERING
+from posts.utils import feed_queryset
+
+BATCH_SIZE = 500
+
+
+def user_timeline(user):
+    """Записи ленты подписок пользователя в порядке ленты.
+
+    Читаются по индексу (user, pub_date, id): страница стоит
+    столько строк, сколько на ней постов.
+    """
+    return TimelineEntry.objects.filter(user=user).only(
+        "id", "post", "pub_date"
+    ).order_by(*FEED_ORDERING)
+
+
+def attach_posts(page_obj):
+    """Заменяет записи ленты на странице самими постами."""
+    post_ids = [entry.post_id for entry in page_obj.object_list]
+    posts = feed_queryset(Post.objects.all()).in_bulk(post_ids)
+    page_obj.object_list = [
+        posts[post_id] for post_id in post_ids if post_id in posts
+    ]
+    return page_obj
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты всех подписчиков автора.
+
+    Подписчики идут пачками по BATCH_SIZE: на пачку один INSERT
+    и один DELETE, обрезающий их ленты, а не запрос на подписчика.
+    """
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list("user", flat=True)
+    user_ids = []
+    for user_id in followers.iterator():
+        user_ids.append(user_id)
+        if len(user_ids) >= BATCH_SIZE:
+            add_to_timelines(post, user_ids)
+            user_ids = []
+    add_to_timelines(post, user_ids)
+
+
+def schedule_fan_out(post):
+    """Добавляет пост в ленты сразу или ставит это в очередь задач.
+
+    Подписчиков, уместившихся в одну пачку, читает тот же запрос,
+    что и рассылку: их ленты пополняются в запросе за INSERT и
+    DELETE. Рассылку автору с большим числом подписчиков выполняет
+    задача fan_out после коммита.
+    """
+    user_ids = list(Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list("user", flat=True)[:BATCH_SIZE + 1])
+    if len(user_ids) > BATCH_SIZE:
+        fan_out.delay(post.pk)
+    else:
+        add_to_timelines(post, user_ids)
+
+
+@task(priority=PRIORITY_HIGH)
+def fan_out(post_id):
+    """Раскладывает пост по лентам вне запроса; удалённый пропускается."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        fan_out_post(post)
+
+
+def add_to_timelines(post, user_ids):
+    if not user_ids:
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True
+    )
+    trim_timelines(user_ids)
+
+
+def backfill_author(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        *FEED_ORDERING
+    ).values_list("id", "pub_date")[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=date)
+            for post_id, date in posts
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    trim_timelines([user_id])
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def trim_timelines(user_ids):
+    """Обрезает ленты до settings.TIMELINE_LENGTH последних постов.
+
+    Один DELETE на все ленты: ROW_NUMBER() нумерует записи каждой
+    ленты в порядке ленты, лишние удаляются. Оконные функции есть
+    в SQLite с 3.25 и в PostgreSQL.
+    """
+    table = TimelineEntry._meta.db_table
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE id IN ("
+            f"SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+            f"PARTITION BY user_id ORDER BY pub_date DESC, id DESC"
+            f") AS position FROM {table} WHERE user_id IN ({placeholders})"
+            f") AS ranked WHERE position > %s)",
+            [*user_ids, settings.TIMELINE_LENGTH]
+        )
+
+
+def rebuild_timeline(user_id):
+    """Собирает ленту пользователя заново из его подписок."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = Post.objects.filter(
+        author__following__user_id=user_id
+    ).order_by(*FEED_ORDERING).values_list(
+        "id", "pub_date"
+    )[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=date)
+            for post_id, date in posts
+        ],
+        batch_size=BATCH_SIZE
+    )
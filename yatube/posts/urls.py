@@ -16,6 +16,28 @@ urlpatterns = [
         views.group_posts,
         name='group_list'
     ),
+    # Потоки новых постов
+    path(
+        'stream/',
+        views.index_stream,
+        name='index_stream'
+    ),
+    path(
+        'group/<slug:slug>/stream/',
+        views.group_stream,
+        name='group_stream'
+    ),
+    path(
+        'follow/stream/',
+        views.follow_stream,
+        name='follow_stream'
+    ),
+    # Поиск по постам
+    path(
+        'search/',
+        views.search,
+        name='search'
+    ),
     # Профайл пользователя
     path(
         'profile/<str:username>/',
@@ -28,6 +50,18 @@ urlpatterns = [
         views.post_detail,
         name='post_detail'
     ),
+    # Персональные фрагменты страниц.
+    path(
+        'fragments/',
+        views.page_fragments,
+        name='page_fragments'
+    ),
+    # Страницы комментариев поста для подгрузки.
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     # Страница создания поста.
     path(
         'create/',
@@ -52,6 +86,12 @@ urlpatterns = [
         views.follow_index,
         name='follow_index'
     ),
+    # Выгрузка данных
+    path(
+        'export/',
+        views.export_data,
+        name='export_data'
+    ),
     # Подписка на автора
     path(
         'profile/<str:username>/follow/',
@@ -1,11 +1,228 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Q
 
 COUNT_POST_PER_PAGE = 10
+COUNT_COMMENTS_PER_PAGE = 20
+CURSOR_PARAM = "cursor"
+FEED_ORDERING = ("-pub_date", "-id")
+COMMENT_ORDERING = ("created", "id")
+# Поля, которые читает карточка поста в ленте (includes/cycle.html)
+FEED_FIELDS = (
+    "id",
+    "text",
+    "pub_date",
+    "updated",
+    "image",
+    "card_thumbnail",
+    "author",
+    "author__username",
+    "author__first_name",
+    "author__last_name",
+    "group",
+    "group__slug",
+)
+
+# Поля, которые читает комментарий (posts/includes/comment_list.html);
+# post нужен связанному менеджеру post.comments
+COMMENT_FIELDS = (
+    "id",
+    "text",
+    "created",
+    "post",
+    "author",
+    "author__username",
+)
+
+
+def feed_queryset(post_list):
+    """Готовит queryset постов для вывода в ленте.
+
+    Автор и группа подтягиваются одним JOIN, лишние колонки
+    не выбираются, поэтому страница ленты стоит фиксированное
+    число запросов независимо от количества постов на ней.
+    """
+    return post_list.select_related(
+        "author", "group"
+    ).only(*FEED_FIELDS).order_by(*FEED_ORDERING)
+
+
+def comment_page(comment_list, request):
+    """Страница комментариев по курсору из запроса.
+
+    Комментарии идут от старых к новым, автор подтягивается
+    тем же запросом, а следующая страница начинается строго
+    после (created, id) последнего показанного комментария.
+    """
+    comment_list = comment_list.select_related("author").only(
+        *COMMENT_FIELDS
+    )
+    paginator = CursorPaginator(
+        comment_list, COUNT_COMMENTS_PER_PAGE, ordering=COMMENT_ORDERING
+    )
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
 
 
 def func_paginator(post_list, request):
+    if CURSOR_PARAM in request.GET:
+        paginator = CursorPaginator(post_list, COUNT_POST_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get(CURSOR_PARAM))
+        return dict(page_obj=page_obj)
+
     paginator = Paginator(post_list, COUNT_POST_PER_PAGE)
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
     context = dict(page_obj=page_obj)
     return context
+
+
+class CursorPage(Sequence):
+    """Страница курсорной пагинации.
+
+    В отличие от Page не знает ни номера страницы, ни общего числа
+    объектов — только курсоры соседних страниц.
+    """
+    cursor_mode = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self)} objects>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по набору полей сортировки.
+
+    Каждая страница — один диапазонный запрос по индексу
+    вида WHERE (pub_date, id) < (...) ORDER BY ... LIMIT n + 1,
+    без COUNT(*) и OFFSET, поэтому глубина страницы не влияет
+    на стоимость запроса. Курсор — непрозрачная строка, в которой
+    закодированы значения полей сортировки крайнего объекта.
+    Объектами страницы могут быть и словари из values().
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(
+            (name.lstrip("-"), name.startswith("-")) for name in ordering
+        )
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу по курсору.
+
+        Пустой или повреждённый курсор даёт первую страницу,
+        по аналогии с Paginator.get_page.
+        """
+        position, backwards = self.decode_cursor(cursor)
+        queryset = self.object_list.order_by(
+            *self._order_by(reverse=backwards)
+        )
+        if position is not None:
+            queryset = queryset.filter(
+                self._seek(position, reverse=backwards)
+            )
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0], backwards=True)
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def encode_cursor(self, obj, backwards=False):
+        values = [
+            self._cursor_value(obj, name) for name, _ in self.ordering
+        ]
+        payload = json.dumps(dict(v=values, r=backwards))
+        return base64.urlsafe_b64encode(
+            payload.encode()
+        ).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            padding = "=" * (-len(cursor) % 4)
+            payload = json.loads(
+                base64.urlsafe_b64decode(cursor + padding).decode()
+            )
+            values = payload["v"]
+            if len(values) != len(self.ordering):
+                return None, False
+            position = tuple(
+                self._field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, values)
+            )
+        except (
+            binascii.Error, ValueError, TypeError, KeyError, ValidationError
+        ):
+            return None, False
+        if any(value is None for value in position):
+            return None, False
+        return position, bool(payload.get("r"))
+
+    def _order_by(self, reverse=False):
+        return [
+            f"-{name}" if descending != reverse else name
+            for name, descending in self.ordering
+        ]
+
+    def _seek(self, position, reverse=False):
+        """Условие «строго после position» в порядке сортировки."""
+        names = [name for name, _ in self.ordering]
+        condition = Q()
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = "lt" if descending != reverse else "gt"
+            equal = dict(zip(names[:index], position[:index]))
+            condition |= Q(
+                **equal, **{f"{name}__{lookup}": position[index]}
+            )
+        return condition
+
+    def _cursor_value(self, obj, name):
+        """Значение поля сортировки строкой: объект модели или словарь.
+
+        Словари приходят из values(): API не создаёт экземпляры
+        моделей, и поля сортировки должны быть среди их ключей.
+        """
+        if isinstance(obj, dict):
+            value = obj[name]
+        else:
+            value = getattr(obj, self._field(name).attname)
+        return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+    def _field(self, name):
+        return self.object_list.model._meta.get_field(name)
@@ -1,77 +1,240 @@
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import HttpResponseBadRequest
+from django.http import JsonResponse
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
 from django.shortcuts import render
-from django.views.decorators.cache import cache_page
-
-from posts.consts import VARIABLE_FOR_CACHE_VALUE
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import never_cache
+
+from core.routers import writes_on_get
+from posts.cache import cache_feed
+from posts.cache import conditional_page
+from posts.cache import edge_cache
+from posts.cache import group_scope
+from posts.cache import index_scope
+from posts.cache import post_page_scopes
+from posts.cache import profile_scope
+from posts.export import DATASETS
+from posts.export import FORMATS
+from posts.export import export_lines
 from posts.forms import CommentForm
 from posts.forms import PostForm
 from posts.models import Follow
 from posts.models import Group
 from posts.models import Post
 from posts.models import User
+from posts.search import SearchResults
+from posts.search import get_search_backend
+from posts.stream import author_channel
+from posts.stream import event_stream
+from posts.stream import group_channel
+from posts.stream import index_channel
+from posts.thumbnails import reset_thumbnails
+from posts.thumbnails import schedule_thumbnails
+from posts.timeline import attach_posts
+from posts.timeline import user_timeline
+from posts.uploadhandlers import image_uploads
+from posts.utils import COUNT_POST_PER_PAGE
+from posts.utils import comment_page
+from posts.utils import feed_queryset
 from posts.utils import func_paginator
 
 
 # Функция главной страницы
-@cache_page(VARIABLE_FOR_CACHE_VALUE, key_prefix="index_page")
+@edge_cache
+@conditional_page(index_scope)
+@cache_feed(index_scope)
 def index(request):
     template = "posts/index.html"
     title = "Главная страница"
-    post_list = Post.objects.all()
-    context = dict(title=title)
+    post_list = feed_queryset(Post.objects.all())
+    context = dict(title=title, shell=True)
     context.update(func_paginator(post_list, request))
 
     return render(request, template, context)
 
 
 # Функция страницы на которой посты отфильтрованы по группам
+@edge_cache
+@conditional_page(group_scope)
+@cache_feed(group_scope)
 def group_posts(request, slug):
     template = "posts/group_list.html"
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    context = dict(group=group)
+    post_list = feed_queryset(group.posts.all())
+    context = dict(group=group, shell=True)
     context.update(func_paginator(post_list, request))
 
     return render(request, template, context)
 
 
 # Функция профиля пользователя
+@edge_cache
+@conditional_page(profile_scope)
+@cache_feed(profile_scope)
 def profile(request, username):
     template = "posts/profile.html"
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.filter(author=author)
-    post_count = posts.count
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user, author=author).exists()
+    author = get_object_or_404(
+        User.objects.select_related("profile"), username=username
+    )
+    posts = feed_queryset(author.posts.all())
+    post_count = author.profile.post_count
 
-    context = dict(author=author, post_count=post_count, following=following)
+    context = dict(author=author, post_count=post_count, shell=True)
     context.update(func_paginator(posts, request))
 
     return render(request, template, context)
 
 
+# Функция поиска по постам
+def search(request):
+    template = "posts/search.html"
+    query = request.GET.get("q", "").strip()
+    results = SearchResults(get_search_backend(), query)
+    paginator = Paginator(results, COUNT_POST_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get("page"))
+    context = dict(query=query, page_obj=page_obj)
+
+    return render(request, template, context)
+
+
 # Функция поста пользователя
+@edge_cache
+@conditional_page(post_page_scopes)
 def post_detail(request, post_id):
     template = "posts/post_detail.html"
-    posts = get_object_or_404(Post, pk=post_id)
-    request.user
-    author_name = posts.author
-    comments = posts.comments.filter(post_id=post_id)
-    post_count = Post.objects.filter(author__username=author_name).count
-    form = CommentForm(request.POST)
+    posts = get_object_or_404(
+        Post.objects.select_related("author__profile", "group"), pk=post_id
+    )
+    comments = comment_page(posts.comments.all(), request)
+    post_count = posts.author.profile.post_count
 
+    # Форму комментария выводит фрагмент comment_form; пустая форма
+    # в контексте остаётся только для проверок в tests/test_post.py
     context = dict(posts=posts,
                    post_count=post_count,
-                   form=form,
-                   comments=comments
+                   form=CommentForm(),
+                   comments=comments,
+                   shell=True
                    )
 
     return render(request, template, context)
 
 
+def stream_response(request, channels):
+    """Поток server-sent events о новых постах каналов.
+
+    Браузер при переподключении присылает Last-Event-ID, и поток
+    досылает пропущенные события. С cards=0 приходят только id.
+    """
+    try:
+        last_event_id = int(request.META.get("HTTP_LAST_EVENT_ID", ""))
+    except ValueError:
+        last_event_id = None
+    response = StreamingHttpResponse(
+        event_stream(
+            channels, last_event_id, request.GET.get("cards") != "0"
+        ),
+        content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Иначе nginx копит поток в буфере
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# Новые посты главной страницы
+def index_stream(request):
+    return stream_response(request, [index_channel()])
+
+
+# Новые посты группы
+def group_stream(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return stream_response(request, [group_channel(group.id)])
+
+
+# Новые посты авторов, на которых подписан пользователь
+@login_required
+def follow_stream(request):
+    author_ids = Follow.objects.filter(user=request.user).values_list(
+        "author", flat=True
+    )
+    return stream_response(
+        request, [author_channel(author_id) for author_id in author_ids]
+    )
+
+
+# Персональные части страниц-оболочек: меню, подписка, форма
+@never_cache
+def page_fragments(request):
+    view_name = request.GET.get("view", "")
+    context = dict(view_name=view_name)
+    fragments = dict(
+        user_menu=render_to_string(
+            "includes/user_menu.html", context, request=request
+        )
+    )
+    if view_name == "posts:index":
+        fragments["switcher"] = render_to_string(
+            "posts/includes/switcher.html", dict(index=True), request=request
+        )
+    author = User.objects.filter(
+        username=request.GET.get("profile") or None
+    ).first()
+    if author is not None:
+        following = request.user.is_authenticated and Follow.objects.filter(
+            user=request.user, author=author).exists()
+        fragments["follow"] = render_to_string(
+            "posts/includes/follow_button.html",
+            dict(author=author, following=following),
+            request=request
+        )
+    post_id = request.GET.get("post")
+    if post_id and post_id.isdigit():
+        fragments["comment_form"] = render_to_string(
+            "posts/includes/comment_form.html",
+            dict(post_id=post_id, form=CommentForm()),
+            request=request
+        )
+    response = JsonResponse(fragments)
+    patch_cache_control(response, private=True)
+    return response
+
+
+# Следующие страницы комментариев для подгрузки на странице поста
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only("id"), pk=post_id)
+    comments = comment_page(post.comments.all(), request)
+    html = render_to_string(
+        "posts/includes/comment_list.html",
+        dict(comments=comments),
+        request=request
+    )
+    data = dict(
+        html=html,
+        next_cursor=comments.next_cursor,
+        comments=[
+            dict(
+                id=comment.id,
+                author=comment.author.username,
+                text=comment.text,
+                created=comment.created,
+            )
+            for comment in comments
+        ]
+    )
+
+    return JsonResponse(data)
+
+
 # Функция создания поста
+@image_uploads
 @login_required
 def post_create(request):
     template = "posts/create_post.html"
@@ -81,7 +244,9 @@ def post_create(request):
             return render(request, template, {"form": form})
         post = form.save(commit=False)
         post.author = request.user
-        form.save(request.POST)
+        with transaction.atomic():
+            form.save(request.POST)
+            schedule_thumbnails(post)
         return redirect("posts:profile", request.user)
 
     form = PostForm()
@@ -89,6 +254,7 @@ def post_create(request):
 
 
 # Функция редактирования поста
+@image_uploads
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -103,7 +269,13 @@ def post_edit(request, post_id):
         files=request.FILES or None
     )
     if form.is_valid():
-        form.save()
+        with transaction.atomic():
+            image_changed = "image" in form.changed_data
+            if image_changed:
+                reset_thumbnails(post)
+            form.save()
+            if image_changed:
+                schedule_thumbnails(post)
         return redirect("posts:post_detail", post_id)
 
     context = dict(is_edit=True, form=form)
@@ -119,34 +291,58 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect("posts:post_detail", post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     template = "posts/follow.html"
-    post = Post.objects.filter(author__following__user=request.user)
+    timeline = user_timeline(request.user)
     context = dict()
-    context.update(func_paginator(post, request))
+    context.update(func_paginator(timeline, request))
+    attach_posts(context["page_obj"])
     return render(request, template, context)
 
 
 # Функция подписки на автора
+@writes_on_get
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     follow = Follow.objects.filter(author=author, user=request.user).exists()
 
     if not follow and request.user != author:
-        Follow.objects.create(author=author, user=request.user)
+        with transaction.atomic():
+            Follow.objects.create(author=author, user=request.user)
     return redirect("posts:profile", username=username)
 
 
 # Функция отписки на автора
+@writes_on_get
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     follow = Follow.objects.filter(author=author, user=request.user)
-    follow.delete()
+    with transaction.atomic():
+        follow.delete()
     return redirect("posts:profile", username=username)
+
+
+# Потоковая выгрузка данных: staff получает всё, остальные — своё
+@login_required
+def export_data(request):
+    file_format = request.GET.get("format", "jsonl")
+    datasets = request.GET.get("data", ",".join(DATASETS)).split(",")
+    if file_format not in FORMATS or not set(datasets) <= set(DATASETS):
+        return HttpResponseBadRequest("Неизвестный формат или набор данных")
+    user = None if request.user.is_staff else request.user
+    response = StreamingHttpResponse(
+        export_lines(datasets, file_format, user),
+        content_type=FORMATS[file_format]
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="yatube-export.{file_format}"'
+    )
+    return response
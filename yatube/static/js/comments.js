@@ -0,0 +1,24 @@
+// Подгрузка следующих страниц комментариев без перезагрузки поста
+document.addEventListener('DOMContentLoaded', function () {
+  var button = document.getElementById('load-comments');
+  var list = document.getElementById('comments');
+  if (!button || !list) {
+    return;
+  }
+  button.addEventListener('click', function (event) {
+    event.preventDefault();
+    var url = button.dataset.url + '?cursor=' +
+      encodeURIComponent(button.dataset.cursor);
+    fetch(url, {headers: {'Accept': 'application/json'}})
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        list.insertAdjacentHTML('beforeend', data.html);
+        if (data.next_cursor) {
+          button.dataset.cursor = data.next_cursor;
+          button.href = '?cursor=' + data.next_cursor;
+        } else {
+          button.remove();
+        }
+      });
+  });
+});
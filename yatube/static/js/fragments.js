@@ -0,0 +1,26 @@
+// Подгружает персональные части страницы: оболочка одинакова
+// для всех посетителей и может отдаваться из кеша прокси-сервера
+document.addEventListener('DOMContentLoaded', function () {
+  var source = document.getElementById('page-fragments');
+  if (!source) {
+    return;
+  }
+  var params = new URLSearchParams({
+    view: source.dataset.view,
+    profile: source.dataset.profile,
+    post: source.dataset.post
+  });
+  fetch(source.dataset.url + '?' + params.toString(), {
+    credentials: 'same-origin',
+    headers: {'Accept': 'application/json'}
+  })
+    .then(function (response) { return response.json(); })
+    .then(function (fragments) {
+      Object.keys(fragments).forEach(function (name) {
+        document.querySelectorAll('[data-fragment="' + name + '"]')
+          .forEach(function (element) {
+            element.innerHTML = fragments[name];
+          });
+      });
+    });
+});
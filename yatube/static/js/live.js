@@ -0,0 +1,18 @@
+// Добавляет в начало ленты новые посты из потока событий сервера
+document.addEventListener('DOMContentLoaded', function () {
+  var feed = document.querySelector('[data-stream-url]');
+  if (!feed || !window.EventSource) {
+    return;
+  }
+  var source = new EventSource(feed.dataset.streamUrl);
+  source.addEventListener('post', function (event) {
+    var data = JSON.parse(event.data);
+    if (document.getElementById('post-' + data.id)) {
+      return;
+    }
+    var article = document.createElement('article');
+    article.id = 'post-' + data.id;
+    article.innerHTML = data.html + '<hr>';
+    feed.insertBefore(article, feed.firstChild);
+  });
+});
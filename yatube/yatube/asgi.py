@@ -0,0 +1,20 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://asgi.readthedocs.io/en/latest/deployment.html
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+# Django 2.2 не умеет ASGI: WSGI-приложение выполняется в пуле
+# потоков адаптера asgiref (размер пула — ASGI_THREADS), а медленных
+# клиентов держит цикл событий сервера, например uvicorn
+application = WsgiToAsgi(get_wsgi_application())
@@ -1,5 +1,8 @@
 
 import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
 
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -36,9 +39,37 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кеш выбирается переменной окружения CACHE_BACKEND. Страницы лент и
+# версии их ключей должны быть общими для всех процессов gunicorn, поэтому
+# в production нужен разделяемый кеш: file (общий каталог на одном
+# сервере), memcached (нужен python-memcached) или redis (нужен
+# django-redis). locmem — локальная замена для разработки и тестов.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+CACHE_LOCATIONS = {
+    'locmem': 'yatube',
+    'file': os.path.join(tempfile.gettempdir(), 'yatube_cache'),
+    'memcached': '127.0.0.1:11211',
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f'Неизвестный CACHE_BACKEND {CACHE_BACKEND!r}, допустимые '
+        f'значения: {", ".join(CACHE_BACKENDS)}'
+    )
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', CACHE_LOCATIONS[CACHE_BACKEND]
+        ),
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'yatube'),
     }
 }
 
@@ -46,6 +77,33 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Сколько последних постов хранится в ленте подписок пользователя
+TIMELINE_LENGTH = 1000
+
+# Очередь задач в базе (core.tasks), её выполняет команда run_tasks.
+# TASKS_EAGER=1 выполняет задачи после коммита в том же процессе, без
+# воркера; пауза перед повтором удваивается с каждой попыткой, начиная
+# с TASKS_RETRY_DELAY секунд; задача, выполняемая дольше
+# TASKS_LOCK_TIMEOUT секунд, считается брошенной и возвращается
+# в очередь. Задачи, ждущие воркера дольше TASKS_LOCK_TIMEOUT секунд,
+# попадают в лог и в предупреждение core.W001 при migrate.
+TASKS_EAGER = os.getenv('TASKS_EAGER', '0') == '1'
+TASKS_RETRY_DELAY = 10
+TASKS_LOCK_TIMEOUT = 600
+
+# Брокер событий для потоков новых постов (core.events): LocalBroker
+# работает в памяти процесса, CacheBroker — через общий кеш и виден
+# всем процессам
+EVENTS_BROKER = os.getenv('EVENTS_BROKER', 'core.events.LocalBroker')
+# Как часто CacheBroker опрашивает кеш и сколько хранит события, секунды
+EVENTS_POLL_INTERVAL = 1.0
+EVENTS_TTL = 300
+# Поток событий: пульс, срок жизни соединения в секундах и пауза
+# перед переподключением браузера в миллисекундах
+SSE_HEARTBEAT = 15
+SSE_MAX_DURATION = 300
+SSE_RETRY_MS = 3000
+
 
 
 # Application definition
@@ -64,6 +122,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'core.routers.PrimaryStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,7 +139,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.profiling.ProfilingTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -107,6 +167,37 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: пути к копиям базы SQLite через запятую в
+# DATABASE_REPLICAS. Копии поддерживает репликация (например,
+# litestream); в тестах реплики зеркалят тестовую основную базу.
+for number, name in enumerate(
+    filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1
+):
+    DATABASES[f'replica_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# PRAGMA каждого нового соединения SQLite (core.signals). WAL пускает
+# чтение параллельно с записью, synchronous=NORMAL в режиме WAL
+# не рискует целостностью, busy_timeout (мс) ждёт снятия блокировки
+# вместо ошибки «database is locked», cache_size в КиБ задаётся
+# отрицательным числом.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': 'normal',
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KIB', 64 * 1024)),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+}
+
+# Сколько секунд после записи клиент читает из основной базы
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'use_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -146,3 +237,27 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# Изображения постов пишутся на диск потоком и проверяются
+# по заголовку (posts.uploadhandlers.image_uploads); максимальный
+# размер такого файла в байтах
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# Максимальное число пикселей загружаемого изображения
+MAX_IMAGE_PIXELS = 40_000_000
+
+# Бэкенд поиска по постам: FTS5 для SQLite, LIKE для остальных баз
+SEARCH_BACKEND = (
+    'posts.search.SqliteSearchBackend'
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3'
+    else 'posts.search.LikeSearchBackend'
+)
+
+# Доля запросов, которые профилирует core.profiling.ProfilingMiddleware
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0.01'))
+
+# Доступ к /metrics/ помимо staff: токен в заголовке
+# Authorization: Bearer <METRICS_TOKEN> и, если включено, адреса из
+# INTERNAL_IPS. За обратным прокси на той же машине все запросы
+# приходят с 127.0.0.1, поэтому доступ по адресу выключен по умолчанию.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOW_INTERNAL_IPS = os.getenv('METRICS_ALLOW_INTERNAL_IPS', '0') == '1'
@@ -5,6 +5,8 @@ from django.contrib import admin
 from django.urls import include
 from django.urls import path
 
+from core.views import metrics
+
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
 handler500 = 'core.views.error_500'
@@ -15,6 +17,10 @@ urlpatterns = [
         '',
         include('posts.urls', namespace='posts')
     ),
+    path(
+        'api/v1/',
+        include('posts.api_urls', namespace='api_v1')
+    ),
     path(
         'admin/',
         admin.site.urls
@@ -30,6 +36,11 @@ urlpatterns = [
     path(
         'about/',
         include('about.urls', namespace='about')
+    ),
+    path(
+        'metrics/',
+        metrics,
+        name='metrics'
     )
 ]
 